@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import multiprocessing
+import shlex
+import sys
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from exceptions import GOIFError, GOIFException
+from goif import GOIF
+
+__author__ = "Chase Hult"
+
+
+class Result(NamedTuple):
+    stdout: str
+    rets: Dict[str, Any]  # Only when the program finished
+    exception: Optional[str]  # An uncaught GOIF exception, with where it was thrown
+    error: Optional[str]  # A runtime error
+
+
+# The program every worker runs.  With fork it's compiled once before the pool starts and workers inherit it.
+_program: Optional[GOIF] = None
+
+
+def _init_worker(fp: str, options: Dict[str, Any]) -> None:
+    global _program
+    if _program is None:
+        # Without fork, each worker compiles the program once.  The compile cache makes this cheap.
+        _program = GOIF(fp, **options)
+
+
+def _run_row(args: List[str]) -> Result:
+    return run_one(_program, args)
+
+
+def run_one(program: GOIF, args: List[str]) -> Result:
+    """Run an already compiled program once, collecting what it printed and returned."""
+    stdout = io.StringIO()
+    rets = {}
+    exception = error = None
+    try:
+        with redirect_stdout(stdout):
+            rets = program.run_returning(*args)
+    except GOIFException as e:
+        exception = e.name
+    except GOIFError as e:
+        error = e.msg
+    return Result(stdout.getvalue(), rets, exception, error)
+
+
+def run_batch(fp: str, rows: Iterable[List[str]], *, processes: Optional[int] = None, chunksize: int = 8,
+              **options) -> Iterator[Result]:
+    """Compile a GOIF file once and run it for each row of arguments on a pool of processes.
+
+    Results come back in the same order as the rows."""
+    global _program
+    if "fork" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("fork")
+        _program = GOIF(fp, **options)
+    else:
+        ctx = multiprocessing.get_context()
+        _program = None
+    try:
+        with ctx.Pool(processes, _init_worker, (fp, options)) as pool:
+            yield from pool.imap(_run_row, rows, chunksize)
+    finally:
+        _program = None
+
+
+def read_rows(lines: Iterable[str]) -> Iterator[List[str]]:
+    """Split each line into an argument list the way a shell would."""
+    for line in lines:
+        yield shlex.split(line)
+
+
+if __name__ == "__main__":
+    offset = 0
+    options = {}
+    if len(sys.argv) > 1 and sys.argv[1].startswith("-"):
+        flags = sys.argv[1]
+        offset = 1
+        options = dict(unsafe_jump='j' in flags, optimize='o' in flags, cache='c' not in flags,
+                       intrinsics='n' not in flags)
+
+    if not sys.argv[1 + offset:]:
+        print("Usage:\n batch.py [-cjno] path/to/file.goif [path/to/rows.txt]")
+        exit(1)
+
+    rows_file = open(sys.argv[2 + offset]) if sys.argv[2 + offset:] else sys.stdin
+    with rows_file:
+        for result in run_batch(sys.argv[1 + offset], read_rows(rows_file), **options):
+            print(json.dumps(result._asdict()), flush=True)
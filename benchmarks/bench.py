@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Benchmarks for compiling and running GOIF.
+
+Results can be written as JSON and compared between commits with compare.py."""
+
+import argparse
+import io
+import json
+import os.path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic  # noqa: E402
+from compiler import get_files, parse_code, preserve_strings, split_lines  # noqa: E402
+from goif import GOIF  # noqa: E402
+
+__author__ = "Chase Hult"
+
+
+class Workload(NamedTuple):
+    name: str
+    source: Optional[str]  # Generated code, or None to use the file at `path`
+    path: Optional[str]
+    args: List[str] = []
+    stdin: str = ""
+    unsafe_jump: bool = False
+
+
+def goif_file(name: str, *args: str, stdin: str = "") -> Workload:
+    return Workload(name, None, os.path.join(ROOT, 'goif_files', name + '.goif'), list(args), stdin)
+
+
+def generated(name: str, source: str, *, unsafe_jump: bool = False) -> Workload:
+    return Workload(name, source, None, unsafe_jump=unsafe_jump)
+
+
+def workloads(scale: float) -> List[Workload]:
+    def n(count):
+        return max(1, int(count * scale))
+
+    return [
+        goif_file('gcd', '1071', '462'),
+        goif_file('grades', '100#85#90#70#'),
+        goif_file('example', stdin="abc\n\nx\n"),
+        goif_file('hey_look_we_totally_have_all_of_the_project_requirements'),
+        generated('loop', synthetic.loop(n(20000))),
+        generated('calls', synthetic.calls(n(10000))),
+        generated('stdlib', synthetic.stdlib(n(500))),
+        generated('unwind_depth_1', synthetic.unwind(n(2000), 1)),
+        generated('unwind_depth_50', synthetic.unwind(n(200), 50)),
+        *[generated(f'recursion_{depth}', synthetic.recursion(depth, n(20)), unsafe_jump=True)
+          for depth in (100, 1000, 5000)],
+        *[generated(f'tail_recursion_{depth}', synthetic.tail_recursion(depth, n(20))) for depth in (100, 1000, 5000)],
+        # Compiling without the cache is slow, so these stay small
+        *[generated(f'lines_{n(count)}', synthetic.lines(n(count))) for count in (100, 1000)],
+        *[generated(f'labels_{n(count)}', synthetic.labels(n(count))) for count in (100, 1000, 5000)],
+    ]
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    """Time a function, giving back the fastest of `repeat` runs in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_once(program: GOIF, workload: Workload) -> None:
+    stdin = sys.stdin
+    sys.stdin = io.StringIO(workload.stdin)
+    try:
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            program.run(*workload.args)
+    finally:
+        sys.stdin = stdin
+
+
+def count_work(program: GOIF, workload: Workload) -> Counter:
+    """Run a program once, counting instructions by type as well as frames pushed, popped and unwound."""
+    counts = Counter()
+
+    def counted(name, fn):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    dispatch = program.dispatch.copy()
+    for cls, fn in dispatch.items():
+        program.dispatch[cls] = counted(cls.__name__, fn)
+    program.push_frame = counted('push_frame', program.push_frame)
+    program.pop_frame = counted('pop_frame', program.pop_frame)
+    program.throw_exc = counted('throw_exc', program.throw_exc)
+    try:
+        run_once(program, workload)
+    finally:
+        program.dispatch.update(dispatch)
+        del program.push_frame, program.pop_frame, program.throw_exc
+    return counts
+
+
+def time_compile(fp: str, workload: Workload, repeat: int) -> Dict[str, float]:
+    """Time each compile phase of the main file, and compiling everything with and without the cache."""
+    with open(fp) as f:
+        code = f.read()
+    results = {}
+
+    preserved = preserve_strings(code, {})
+    results['preserve_strings'] = best_of(lambda: preserve_strings(code, {}), repeat)
+    stripped, _ = get_files(preserved)
+    results['get_files'] = best_of(lambda: get_files(preserved), repeat)
+    results['split_lines'] = best_of(lambda: split_lines(stripped, workload.name), repeat)
+    results['parse_code'] = best_of(lambda: parse_code(stripped.upper()), repeat)
+
+    options = dict(unsafe_jump=workload.unsafe_jump)
+    results['total_uncached'] = best_of(lambda: GOIF(fp, cache=False, **options), repeat)
+    GOIF(fp, **options)  # Fill the cache
+    results['total_cached'] = best_of(lambda: GOIF(fp, **options), repeat)
+    return results
+
+
+def benchmark(workload: Workload, directory: str, repeat: int) -> Dict[str, Any]:
+    fp = workload.path
+    if fp is None:
+        fp = os.path.join(directory, workload.name + '.goif')
+        with open(fp, 'w') as f:
+            f.write(workload.source)
+
+    result = {'compile': time_compile(fp, workload, repeat)}
+
+    program = GOIF(fp, unsafe_jump=workload.unsafe_jump)
+    # Superinstructions run two statements at once, so count with them off to see every statement
+    counts = count_work(GOIF(fp, unsafe_jump=workload.unsafe_jump, superinstructions=False), workload)
+    seconds = best_of(lambda: run_once(program, workload), repeat)
+    statements = sum(count for name, count in counts.items() if name[0].isupper())
+    # Intrinsics and tail calls are JUMPs too, even though they don't push a frame
+    jumps = counts['Jump'] + counts['Native'] + counts['TailJump']
+    result['run'] = {
+        'seconds': seconds,
+        'statements': statements,
+        'statements_per_sec': statements / seconds,
+        'jumps': jumps,
+        'jumps_per_sec': jumps / seconds,
+        'returns': counts['pop_frame'],
+        'throws': counts['throw_exc'],
+        'seconds_per_throw': seconds / counts['throw_exc'] if counts['throw_exc'] else None,
+        'by_statement': {name: count for name, count in sorted(counts.items()) if name[0].isupper()},
+    }
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('names', nargs='*', help="only run these benchmarks")
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="take the best of this many runs")
+    parser.add_argument('-s', '--scale', type=float, default=1.0, help="scale the size of generated programs")
+    options = parser.parse_args()
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': options.repeat,
+            'scale': options.scale,
+        },
+        'benchmarks': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for workload in workloads(options.scale):
+            if options.names and workload.name not in options.names:
+                continue
+            result = benchmark(workload, directory, options.repeat)
+            results['benchmarks'][workload.name] = result
+            run, comp = result['run'], result['compile']
+            print(f"{workload.name:<60} {run['seconds'] * 1000:9.2f} ms  {run['statements_per_sec']:12,.0f} stmt/s"
+                  f"  compile {comp['total_uncached'] * 1000:8.2f} ms ({comp['total_cached'] * 1000:.2f} ms cached)",
+                  file=sys.stderr)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
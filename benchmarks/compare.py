@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Compare two sets of benchmark results from bench.py."""
+
+import json
+import sys
+from typing import Any, Dict, Iterator, Tuple
+
+__author__ = "Chase Hult"
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + key, value
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    old_values = dict(flatten(old['benchmarks']))
+    for key, value in flatten(new['benchmarks']):
+        if key not in old_values or not old_values[key]:
+            continue
+        # Only times and rates say anything about speed.  Counts should match unless the program changed.
+        if key.endswith('seconds') or key.endswith('per_sec') or key.endswith('per_throw') \
+                or key.split('.')[-2:-1] == ['compile']:
+            ratio = value / old_values[key]
+            faster = ratio > 1 if key.endswith('per_sec') else ratio < 1
+            if round(ratio, 2) == 1:
+                verdict = 'unchanged'
+            else:
+                verdict = 'faster' if faster else 'slower'
+            print(f"{key:<70} {old_values[key]:12.6g} -> {value:12.6g}  {ratio:6.2f}x {verdict}")
+        elif value != old_values[key]:
+            print(f"{key:<70} {old_values[key]:12.6g} -> {value:12.6g}  (changed)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage:\n compare.py old.json new.json")
+        exit(1)
+    with open(sys.argv[1]) as f1, open(sys.argv[2]) as f2:
+        compare(json.load(f1), json.load(f2))
@@ -0,0 +1,126 @@
+"""Generators for GOIF programs that stress one thing at a time.
+
+Each one gives back the source of a program that runs on its own with no arguments or input."""
+
+__author__ = "Chase Hult"
+
+
+def loop(n: int) -> str:
+    """A loop of arithmetic that runs `n` times."""
+    return f"""\
+0 INTO I
+0 INTO X
+LOOP:
+GOIF END I == {n}
+(X * 31 + I) \\ 1000003 INTO X
+I + 1 INTO I
+GO LOOP
+END:
+"""
+
+
+def calls(n: int) -> str:
+    """`n` JUMPs with an argument, each RETURNing a value."""
+    return f"""\
+0 INTO I
+LOOP:
+GOIF END I == {n}
+JUMP F (I)
+RET1 INTO I
+GO LOOP
+F:
+RETURN (ARG1 + 1)
+END:
+"""
+
+
+def recursion(depth: int, n: int = 1) -> str:
+    """Recurse `depth` frames deep `n` times.  Anything past 255 frames needs unsafe_jump.
+
+    Each call uses what the one it makes RETURNs, so none of them are tail calls."""
+    return f"""\
+0 INTO I
+LOOP:
+GOIF END I == {n}
+I + 1 INTO I
+JUMP R (0)
+GO LOOP
+R:
+GOIF ~3 ARG1 == {depth}
+JUMP R ((ARG1 + 1))
+RET1 INTO X
+RETURN (ARG1)
+END:
+"""
+
+
+def tail_recursion(depth: int, n: int = 1) -> str:
+    """Make `depth` tail calls in a row `n` times.  These reuse the frame, so they never go over the depth limit."""
+    return f"""\
+0 INTO I
+LOOP:
+GOIF END I == {n}
+I + 1 INTO I
+JUMP R (0)
+GO LOOP
+R:
+GOIF ~2 ARG1 == {depth}
+JUMP R ((ARG1 + 1))
+RETURN
+END:
+"""
+
+
+def unwind(n: int, depth: int) -> str:
+    """Throw an exception `depth` frames deep and handle it at the top, `n` times."""
+    return f"""\
+0 INTO I
+LOOP:
+GOIF END I == {n}
+I + 1 INTO I
+JUMP D (0) HANDLE BOOM LOOP
+GO LOOP
+D:
+GOIF ~2 ARG1 == {depth}
+JUMP D ((ARG1 + 1))
+THROW BOOM
+END:
+"""
+
+
+def stdlib(n: int) -> str:
+    """Call each of the standard library routines `n` times."""
+    return f"""\
+0 INTO I
+LOOP:
+GOIF END I == {n}
+I + 1 INTO I
+JUMP STD:LENGTH ("hello world")
+JUMP STD:TO_NUM ("-12345")
+JUMP STD:TO_STRING (987654)
+JUMP STD:SQRT (1000000)
+GO LOOP
+END:
+"""
+
+
+def lines(n: int) -> str:
+    """`n` lines of straight line code, mixing every kind of statement and expression."""
+    body = [
+        '"line" ^ "{i}" INTO S{m}',
+        '(X{m} + {i}) * 2 - 1 INTO X{m}',
+        'GOIF ~1 !(X{m} > {i} | @Y{m})',
+        '@ INTO Y{m}',
+        'JUMP F ((X{m} \\ 7), S{m} ^ "!")',
+    ]
+    code = [f"0 INTO X{m}" for m in range(10)] + [f'"" INTO S{m}' for m in range(10)]
+    code += [body[i % len(body)].format(i=i, m=i % 10) for i in range(n)]
+    return "\n".join(code) + "\nGO END\nF:\nRETURN (ARG1, ARG2)\nEND:\n"
+
+
+def labels(n: int) -> str:
+    """`n` labels, each of which GOes to the next."""
+    code = []
+    for i in range(n):
+        code += [f"L{i}:", f"GO L{i + 1}"]
+    return "\n".join(code) + f"\nL{n}:\n"
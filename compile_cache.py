@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import hashlib
+import marshal
+import multiprocessing
+import os.path
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple
+
+from compiler import Module, compile_module, outline_module
+from statements import Const, Go, GoIf, Into, Jump, LineId, Op, Return, SpecialValues, Str, Throw, Unset, Var
+
+__author__ = "Chase Hult"
+
+CACHE_DIR = "__goifcache__"
+
+# Changing any of these can change what a file compiles to
+COMPILER_FILES = ("compiler.py", "parser_pyp.py", "statements.py", "operator_exprs.py")
+
+# Parsing takes about 0.1 ms a character, and starting a pool of processes takes a few tenths of a second.  A pool
+# only pays off when there's at least this much source to parse besides the biggest file, which is what it saves.
+MIN_PARALLEL_SOURCE = 3000
+
+# Caches only hold plain data, and statements are rebuilt from it by name, so a cache file someone else wrote can't
+# make this run anything.  These are all the nodes the parser makes.
+NODES = {cls.__name__: cls for cls in (LineId, Const, Str, Var, Unset, Op, Go, GoIf, Jump, Throw, Return, Into)}
+EMPTY = ("@",)  # Stands for SpecialValues.Empty
+
+
+@lru_cache(maxsize=None)
+def interpreter_version() -> bytes:
+    """Identify this interpreter so that caches from any other version are ignored."""
+    digest = hashlib.sha256(sys.version.encode())
+    for fn in COMPILER_FILES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), fn), 'rb') as f:
+            digest.update(f.read())
+    return digest.digest()
+
+
+def cache_key(code: str) -> str:
+    return hashlib.sha256(interpreter_version() + code.encode()).hexdigest()
+
+
+def cache_path(fp: str) -> str:
+    return os.path.join(os.path.dirname(fp), CACHE_DIR, os.path.basename(fp) + ".marshal")
+
+
+def read_module(fp: str, name: Optional[str] = None, *, cache: bool = True) -> Tuple[str, Module]:
+    """Read a GOIF file, returning its source and its cached module if neither the file nor the interpreter has
+    changed.  Otherwise the module is only outlined, and nothing is parsed."""
+    with open(fp) as f:
+        code = f.read()
+    module = read_cache(fp, cache_key(code)) if cache else None
+    return code, module or outline_module(code, name or os.path.basename(fp))
+
+
+def build_module(fp: str, code: str, name: Optional[str] = None, *, cache: bool = True) -> Module:
+    """Compile the source of the GOIF file at `fp`, saving it in the cache.  Only fully validated modules are ever
+    cached."""
+    module = compile_module(code, name or os.path.basename(fp))
+    if cache:
+        write_cache(fp, cache_key(code), module)
+    return module
+
+
+def load_module(fp: str, name: Optional[str] = None, *, cache: bool = True) -> Module:
+    """Compile a GOIF file, reusing its cached module if neither the file nor the interpreter has changed."""
+    code, module = read_module(fp, name, cache=cache)
+    return module if module.stmts is not None else build_module(fp, code, name, cache=cache)
+
+
+def compile_modules(files: List[Tuple[str, str, Optional[str]]], *, cache: bool = True,
+                    processes: Optional[int] = None) -> List[Module]:
+    """Compile GOIF files given as (path, source, name) like build_module, on a pool of processes if there's more
+    than one.
+
+    Modules come back in the same order as the files.  If any fail, the error from the first one in that order is
+    raised, so it's the same no matter which process finishes first."""
+    processes = min(len(files), processes or os.cpu_count() or 1)
+    sizes = [len(code) for _, code, _ in files]
+    # Daemonic processes, like the workers in batch.py, can't start any of their own
+    if processes <= 1 or sum(sizes) - max(sizes) < MIN_PARALLEL_SOURCE or multiprocessing.current_process().daemon:
+        return [build_module(fp, code, name, cache=cache) for fp, code, name in files]
+
+    # Forking this process could copy a lock that another thread holds, like the parser's, which would never be
+    # released in the copy.  Workers come from a fork server that has nothing running but the compiler instead.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['compile_cache'])
+    else:
+        context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(processes, mp_context=context) as pool:
+        futures = [pool.submit(build_module, fp, code, name, cache=cache) for fp, code, name in files]
+        modules = []
+        for future in futures:
+            try:
+                modules.append(future.result())
+            except Exception as e:  # Errors while compiling come from all over, including the parser
+                for other in futures:
+                    other.cancel()
+                # Raise it as if it happened here, instead of chained to the worker's traceback
+                raise e from None
+        return modules
+
+
+def to_data(value: Any) -> Any:
+    """Turn statements into plain tuples and lists that marshal can save.  A node becomes its class's name followed
+    by its fields, and any other tuple becomes a list."""
+    if value is SpecialValues.Empty:
+        return EMPTY
+    if type(value) is tuple:
+        return [to_data(v) for v in value]
+    if isinstance(value, tuple):
+        return (type(value).__name__, *map(to_data, value))
+    return value
+
+
+def from_data(data: Any) -> Any:
+    """Rebuild statements saved by to_data."""
+    if type(data) is list:
+        return tuple(map(from_data, data))
+    if type(data) is tuple:
+        if data == EMPTY:
+            return SpecialValues.Empty
+        return NODES[data[0]](*map(from_data, data[1:]))
+    return data
+
+
+def read_cache(fp: str, key: str) -> Optional[Module]:
+    try:
+        with open(cache_path(fp), 'rb') as f:
+            cached_key, links, labels, stmts, lines, strs = marshal.load(f)
+        if cached_key != key:
+            return None
+        return Module(links, labels, {ln: from_data(stmt) for ln, stmt in stmts.items()}, lines, strs)
+    except Exception:  # A missing or broken cache just means compiling again
+        return None
+
+
+def write_cache(fp: str, key: str, module: Module) -> None:
+    """Save a compiled module.  The cache is only an optimization, so failing to write it is fine."""
+    path = cache_path(fp)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so nothing ever reads a half written cache
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                stmts = {ln: to_data(stmt) for ln, stmt in module.stmts.items()}
+                marshal.dump((key, module.links, module.labels, stmts, module.lines, module.strs), f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        pass
+
+
+def prebuild(paths: Iterable[str]) -> bool:
+    """Build the cache for GOIF files, searching directories for them.  Returns whether everything compiled."""
+    ok = True
+    for path in paths:
+        if os.path.isdir(path):
+            fps = [os.path.join(root, fn) for root, _, fns in os.walk(path)
+                   for fn in sorted(fns) if fn.endswith(".goif")]
+        else:
+            fps = [path]
+        for fp in fps:
+            fp = os.path.abspath(fp)
+            print(f"Compiling {fp!r}...")
+            try:
+                load_module(fp)
+            except Exception as e:  # Syntax errors come straight from the parser, so catch everything
+                print(f"*** Error compiling {fp!r}: {type(e).__name__}: {e}")
+                ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    # The standard library is used by everything, so it's always built
+    std = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'std.goif')
+    exit(0 if prebuild([std, *sys.argv[1:]]) else 1)
@@ -0,0 +1,354 @@
+import re
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from exceptions import GOIFCompileError, GOIFRuntimeError
+from operator_exprs import RESULT_TYPES, operate, specialize
+from statements import Const, End, Expr, Go, GoGoIf, GoIf, GoIfInto, Into, IntoGo, IntoGoIf, IntoInto, Jump, LineId, \
+    Op, Return, SpecialValues, Stmt, Str, TailJump, Unset, Var, Write
+
+__author__ = "Chase Hult"
+
+# A compiled expression takes the running interpreter and returns the expression's value
+Compiled = Callable[[Any], Any]
+
+STREAMS = ("STDIN", "STDOUT", "STDERR")
+
+UNSET = SpecialValues.Empty  # What the slot of an unset variable holds
+
+# The grammar is never modified, but pyparsing keeps its packrat cache on the class, so only one thread can parse
+# at a time
+_parse_lock = threading.Lock()
+
+
+class Module(NamedTuple):
+    """Everything known about a file before it's linked to the files it loads.
+
+    This only holds plain data so it can be cached on disk."""
+    links: Dict[str, str]  # File identifiers to the paths they load
+    labels: Dict[str, int]  # Line labels to line numbers
+    stmts: Optional[Dict[int, Stmt]]  # Line numbers to statements, before any folding.  None until parsed.
+    lines: Dict[int, str]  # Line numbers to statements as written
+    strs: Dict[int, str]  # Preserved strings
+
+
+def compile_module(code: str, name: str) -> Module:
+    """Validate and parse the source of a GOIF file named `name`."""
+    strs = {}
+    code = preserve_strings(code, strs)
+    checked = code  # LOAD lines are checked too, so keep a copy from before they're removed
+    code, links = get_files(code)
+    lines, labels = split_lines(code, name)
+    stmts = parse_code(code.upper()) if all(map(valid_link, links, links.values())) else None
+    if stmts is None or list(stmts) != list(lines):
+        # The file as a whole doesn't read the same as its lines one by one.  Check and parse it the slow way,
+        #  which says what's wrong with it.
+        assert_code(checked)
+        stmts = {ln: parse_stmt(line) for ln, line in lines.items()}
+    return Module(links, labels, stmts, lines, strs)
+
+
+def outline_module(code: str, name: str) -> Module:
+    """Find the loads, labels and statements of a GOIF file without parsing or validating anything."""
+    strs = {}
+    code, links = get_files(preserve_strings(code, strs))
+    lines, labels = split_lines(code, name)
+    return Module(links, labels, None, lines, strs)
+
+
+def parse_module(module: Module, name: str) -> Module:
+    """Parse the statements of an outlined module named `name`.  Each line is only checked on its own."""
+    if module.stmts is not None:
+        return module
+    stmts = {}
+    for ln, line in module.lines.items():
+        try:
+            stmts[ln] = parse_stmt(line)
+        except GOIFRuntimeError as e:
+            raise GOIFCompileError(f"{e.msg} (line {ln}, file '{name}')") from None
+    return module._replace(stmts=stmts)
+
+
+def split_lines(code: str, name: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+    """Split code into its statements and labels by line number, dropping comments and extra whitespace."""
+    lines = {}
+    labels = {}
+    for ln, line in enumerate(code.split('\n'), 1):
+        line = line.split('%')[0].strip().upper()
+        if line.endswith(':'):
+            label = line[:-1]
+            if label in labels:
+                raise GOIFCompileError(f"Label '{label}' appeared at least twice in file {name}"
+                                       f" (lines {labels[label]} and {ln})")
+            if not re.fullmatch(r'[\w.]+', label):
+                raise GOIFCompileError(f"Invalid label name in file {name}: '{label}'")
+            labels[label] = ln
+            continue
+        if line:
+            lines[ln] = re.sub(r'\s+', ' ', line)
+    labels.setdefault('MAIN', 1)
+    return lines, labels
+
+
+def assert_code(code: str) -> None:
+    """Assert that an entire code file is valid.
+
+    This must be done before removing comments and labels, but after preserving strings.  Labels are checked
+    when linking, since that needs the other files."""
+    from parser_pyp import cfg_code  # Importing the grammar is slow, so only do it when there's something to parse
+    with _parse_lock:
+        assert cfg_code.parse_string(code) is not None
+
+
+def parse_code(code: str) -> Optional[Dict[int, Stmt]]:
+    """Parse every statement of a code file without LOAD lines by line number, or None if it isn't valid."""
+    from parser_pyp import cfg_module
+    from pyparsing import ParseException
+    try:
+        with _parse_lock:
+            results = cfg_module.parse_string(code)
+    except ParseException:
+        return None
+    return dict(zip(results[::2], results[1::2]))
+
+
+def valid_link(fid: str, fp: str) -> bool:
+    """Whether a LOAD line loading `fp` as `fid` is valid."""
+    return re.fullmatch(r'[\w./]+', fp, re.A) is not None and re.fullmatch(r'[\w.]+', fid, re.A) is not None \
+        and fid != "MAIN"
+
+
+def parse_stmt(line: str) -> Stmt:
+    """Parse one line of GOIF into a statement node."""
+    from parser_pyp import cfg_stmt
+    from pyparsing import ParseException
+    try:
+        with _parse_lock:
+            return cfg_stmt.parse_string(line, parse_all=True)[0]
+    except ParseException:
+        raise GOIFRuntimeError(f"Invalid statement: {repr(line)}.") from None
+
+
+def preserve_strings(code: str, strs: Dict[int, str]) -> str:
+    """Replace strings in a file with an identifier to recall them later.  This makes parsing easier."""
+    idx = max(strs, default=0) + 1
+
+    def replace_and_increment(match) -> str:
+        nonlocal idx
+        strs[idx] = match.group(1).replace('\\n', '\n').replace('\\t', '\t') \
+            .replace('\\"', '"').replace('\\0', '\0')
+        idx += 1
+        return f'"{idx - 1}"'
+
+    # Honestly, this is probably regular.  I'm too lazy to write w/o lookbehinds though.
+    code = re.sub(r'(?<!\\)"((?:[^"\n]|(?<=\\)")*)(?<!\\)"', replace_and_increment, code)
+    return code
+
+
+def get_files(code: str) -> Tuple[str, Dict[str, str]]:
+    """Get the loaded files out of a code block"""
+    files = {}
+
+    def save_file(match) -> str:
+        files[match.group(2).upper()] = match.group(1)
+        return ""
+
+    code = re.sub(r'^\s*LOAD\s+(\S+)\s+(\S+)\s*$', save_file, code, flags=re.I + re.M)
+    return code, files
+
+
+def slot(slots: Dict[str, int], var: str) -> int:
+    """Give the index of a variable in every frame, making a new slot for a name that hasn't been seen."""
+    return slots.setdefault(var, len(slots))
+
+
+def compile_expr(expr: Expr, strs: Dict[int, str], slots: Dict[str, int]) -> Compiled:
+    """Compile an expression tree into nested closures.
+
+    Strings and variable slots are looked up once here, so evaluating a compiled expression never touches the
+    parser or hashes a name.
+    """
+    if isinstance(expr, Const):
+        value = expr.value
+        return lambda g: value
+    if isinstance(expr, Str):
+        value = strs[expr.idx]
+        return lambda g: value
+    if isinstance(expr, Var):
+        name = expr.name
+        if name == "STDIN":
+            return lambda g: g.streams.read_line()
+        if name in STREAMS:
+            def write_only(g):
+                raise GOIFRuntimeError(f"You cannot write to {name}.")
+
+            return write_only
+
+        index = slot(slots, name)
+
+        def var(g):
+            value = g.vars[index]
+            if value is UNSET:
+                raise GOIFRuntimeError(f"Unknown variable {name}.")
+            return value
+
+        return var
+    if isinstance(expr, Unset):
+        index = slot(slots, expr.name)
+        return lambda g: g.vars[index] is UNSET
+
+    args = [compile_expr(arg, strs, slots) for arg in expr.args]
+    return specialize(expr.op, args, [static_type(arg) for arg in expr.args])
+
+
+def static_type(expr: Expr) -> Optional[type]:
+    """Give the type an expression always evaluates to, or None if it can't be known before running."""
+    if isinstance(expr, Const):
+        return type(expr.value)
+    if isinstance(expr, Str):
+        return str
+    if isinstance(expr, Unset):
+        return bool
+    if isinstance(expr, Op):
+        if len(expr.args) == 3:
+            _, a2, a3 = map(static_type, expr.args)
+            return a2 if a2 is a3 else None
+        if expr.op == '-' and len(expr.args) == 1:
+            # Negating something that isn't an integer doesn't give back an integer
+            return int if static_type(expr.args[0]) in (int, bool) else None
+        return RESULT_TYPES[expr.op]
+    return None
+
+
+def compile_stmt(stmt: Stmt, strs: Dict[int, str], slots: Dict[str, int]) -> Stmt:
+    """Replace the expression trees in a statement with compiled expressions and its variables with slots.
+
+    JUMP arguments and RETURN values become (slot, compiled expression) pairs, and an INTO a standard
+    stream becomes a Write."""
+    if isinstance(stmt, GoIf):
+        return stmt._replace(cond=compile_expr(stmt.cond, strs, slots))
+    if isinstance(stmt, Jump):
+        return stmt._replace(args=tuple((slot(slots, f'ARG{c}'), compile_expr(arg, strs, slots))
+                                        for c, arg in enumerate(stmt.args, 1)))
+    if isinstance(stmt, Return):
+        return stmt._replace(rets=tuple((slot(slots, f'RET{c}'), compile_expr(ret, strs, slots))
+                                        for c, ret in enumerate(stmt.rets, 1)))
+    if isinstance(stmt, Into):
+        if stmt.expr is SpecialValues.Empty:
+            # Nothing is ever stored in a stream's slot, so unsetting one does nothing, just like before
+            return stmt._replace(expr=lambda g: UNSET, var=slot(slots, stmt.var))
+        if stmt.var in STREAMS:
+            return Write(compile_expr(stmt.expr, strs, slots), stmt.var)
+        return stmt._replace(expr=compile_expr(stmt.expr, strs, slots), var=slot(slots, stmt.var))
+    return stmt
+
+
+def fold_expr(expr: Expr, strs: Dict[int, str]) -> Expr:
+    """Fold constant sub-expressions.
+
+    Anything that would throw or raise an error is left alone so it still does so at runtime.
+    """
+    if isinstance(expr, Str):
+        return Const(strs[expr.idx])
+    if not isinstance(expr, Op):
+        return expr
+
+    args = tuple(fold_expr(arg, strs) for arg in expr.args)
+    if all(isinstance(arg, Const) for arg in args):
+        try:
+            value = operate(expr.op, *[arg.value for arg in args])
+        except Exception:  # Some operators raise Python errors, like # out of range.  Those have to happen at runtime.
+            return Op(expr.op, args)
+        if value is not None:
+            return Const(value)
+    elif expr.op == '?' and isinstance(args[0], Const) and isinstance(args[0].value, bool):
+        # Both branches are always evaluated, so we can only drop one that can't fail
+        taken, dropped = (args[1], args[2]) if args[0].value else (args[2], args[1])
+        if isinstance(dropped, Const):
+            return taken
+    elif expr.op in ('&', '|') and len(args) == 2:
+        # TRUE & x and FALSE | x are just x, as long as x is certainly a bool
+        identity = expr.op == '&'
+        for const, other in (args, args[::-1]):
+            if isinstance(const, Const) and const.value is identity and static_type(other) is bool:
+                return other
+    return Op(expr.op, args)
+
+
+def fold_stmt(stmt: Stmt, strs: Dict[int, str]) -> Optional[Stmt]:
+    """Fold the constants in a statement.
+
+    GOIFs that always go become GOs, and GOIFs that never go are dropped by giving back None.
+    """
+    if isinstance(stmt, GoIf):
+        cond = fold_expr(stmt.cond, strs)
+        if isinstance(cond, Const) and cond.value is True:
+            return Go(stmt.target)
+        if isinstance(cond, Const) and cond.value is False:
+            return None
+        return stmt._replace(cond=cond)
+    if isinstance(stmt, Jump):
+        return stmt._replace(args=tuple(fold_expr(arg, strs) for arg in stmt.args))
+    if isinstance(stmt, Return):
+        return stmt._replace(rets=tuple(fold_expr(ret, strs) for ret in stmt.rets))
+    if isinstance(stmt, Into) and stmt.expr is not SpecialValues.Empty:
+        return stmt._replace(expr=fold_expr(stmt.expr, strs))
+    return stmt
+
+
+def set_vars(stmt: Stmt) -> List[str]:
+    """Give the variables a statement can set in the frame it runs in or the one it makes."""
+    if isinstance(stmt, Into):
+        return [stmt.var]
+    if isinstance(stmt, Jump):
+        return [f'ARG{c}' for c in range(1, len(stmt.args) + 1)]
+    if isinstance(stmt, Return):
+        return [f'RET{c}' for c in range(1, len(stmt.rets) + 1)]
+    return []
+
+
+def mark_tail_calls(stmts: List[Stmt]) -> List[Stmt]:
+    """Turn each JUMP with no HANDLEs that's followed by a bare RETURN (or the end of the file) into a TailJump.
+
+    Only what runs next matters, so this works on a file's flat list of instructions."""
+    return [TailJump(stmt.target, stmt.args)
+            if stmt.__class__ is Jump and not stmt.handlers
+            and (stmts[pc + 1].__class__ is End or stmts[pc + 1].__class__ is Return and not stmts[pc + 1].rets)
+            else stmt for pc, stmt in enumerate(stmts)]
+
+
+# Superinstructions, and the instruction each one starts with
+SUPERINSTRUCTIONS = {IntoInto: Into, IntoGoIf: Into, IntoGo: Into, GoIfInto: GoIf, GoGoIf: Go}
+
+
+def fuse_superinstructions(stmts: List[Stmt], fid: int) -> List[Stmt]:
+    """Fuse each instruction of file `fid` with the one that runs after it where there's a superinstruction for it.
+
+    Every instruction keeps its place, so GOing into the middle of a pair still works and there's no need to
+    find where basic blocks start."""
+    fused = list(stmts)
+    for pc, (stmt, after) in enumerate(zip(stmts, stmts[1:])):
+        cls, after_cls = stmt.__class__, after.__class__
+        if cls is Into:
+            if after_cls is Into:
+                fused[pc] = IntoInto(stmt.expr, stmt.var, after.expr, after.var)
+            elif after_cls is GoIf:
+                fused[pc] = IntoGoIf(stmt.expr, stmt.var, after.target, after.cond)
+            elif after_cls is Go:
+                fused[pc] = IntoGo(stmt.expr, stmt.var, after.target)
+        elif cls is GoIf and after_cls is Into:
+            fused[pc] = GoIfInto(stmt.target, stmt.cond, after.expr, after.var)
+        elif cls is Go and stmt.target[0] == fid and stmts[stmt.target[1]].__class__ is GoIf:
+            target = stmts[stmt.target[1]]
+            fused[pc] = GoGoIf(stmt.target, target.target, target.cond)
+    return fused
+
+
+def link_stmt(stmt: Stmt, resolve: Callable[[LineId], Tuple[int, int]]) -> Stmt:
+    """Replace the labels in a statement with (file id, instruction index) targets."""
+    if isinstance(stmt, (Go, GoIf)):
+        return stmt._replace(target=resolve(stmt.target))
+    if isinstance(stmt, Jump):
+        return stmt._replace(target=resolve(stmt.target),
+                             handlers={exc: resolve(label) for exc, label in stmt.handlers})
+    return stmt
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+from exceptions import GOIFError, GOIFException
+from goif import GOIF
+from goifc import FLAGS, LIMITS, check_peer, socket_path
+from limits import Limits
+from streams import Streams
+
+__author__ = "Chase Hult"
+
+
+def file_stamps(program: GOIF) -> Dict[str, Optional[Tuple[int, int]]]:
+    """Get the modification time and size of every file a program was compiled from."""
+    stamps = {}
+    for fp in program.fn_map:
+        if fp is not None:
+            try:
+                stat = os.stat(fp)
+                stamps[fp] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stamps[fp] = None
+    return stamps
+
+
+def read_request(data: bytes) -> Dict[str, Any]:
+    """Decode a request from goifc.py, raising a ValueError if it isn't a valid one."""
+    request = json.loads(data)
+    if not isinstance(request, dict) or not isinstance(request.get('path'), str) \
+            or not isinstance(request.get('cwd'), str) or not os.path.isabs(request['cwd']):
+        raise ValueError("A request needs a path and the absolute directory it's relative to.")
+    args = request.setdefault('args', [])
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        raise ValueError("Arguments must be strings.")
+    options = request.setdefault('options', {})
+    if not isinstance(options, dict) \
+            or not all(name in FLAGS.values() and isinstance(value, bool) for name, value in options.items()):
+        raise ValueError("Options must be flags goifc.py takes.")
+    limits = request.setdefault('limits', {})
+    # JSON doesn't keep 1.0 and 1 apart, so any number is fine for a limit that takes floats
+    if not isinstance(limits, dict) or not all(name in LIMITS and type(value) in (LIMITS[name], int)
+                                               for name, value in limits.items()):
+        raise ValueError("Limits must be numbers goifc.py takes.")
+    return request
+
+
+def write_error(stderr, message: str) -> None:
+    try:
+        stderr.write(message)
+    except OSError:
+        pass
+
+
+class ProgramPool:
+    """Compiled programs that aren't running, by path, the directory it's relative to, and options.
+
+    A program is only reused if none of its files have changed since it was compiled.  If one has, the program is
+    compiled again, which is quick for every file that didn't change thanks to the compile cache."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle: Dict[Tuple, List[Tuple[Dict, GOIF]]] = {}
+
+    def take(self, fp: str, cwd: str, options: Dict[str, Any]) -> Tuple[Tuple, GOIF]:
+        key = (fp, cwd, tuple(sorted(options.items())))
+        with self.lock:
+            idle = self.idle.get(key, [])
+            while idle:
+                stamps, program = idle.pop()
+                if file_stamps(program) == stamps:
+                    return key, program
+        program = GOIF(fp, base_dir=cwd, **options)
+        return key, program
+
+    def give_back(self, key: Tuple, program: GOIF, stamps: Dict) -> None:
+        with self.lock:
+            self.idle.setdefault(key, []).append((stamps, program))
+
+
+class RunHandler(socketserver.BaseRequestHandler):
+    """Run one program with the client's STDIN, STDOUT and STDERR, then send back its exit status."""
+
+    def handle(self) -> None:
+        data, fds, _, _ = socket.recv_fds(self.request, 1 << 16, 3)
+        files = []
+        try:
+            # Anyone else could use this to run programs as this user
+            check_peer(self.request, self.server.server_address)
+            if len(fds) != 3:
+                return
+            # The descriptors are closed below no matter what, so the files leave them open
+            files = [open(fd, mode, closefd=False) for fd, mode in zip(fds, ('rb', 'w', 'w'))]
+            while not data.endswith(b"\n"):
+                if not (chunk := self.request.recv(1 << 16)):
+                    break
+                data += chunk
+            try:
+                request = read_request(data)
+            except ValueError as e:
+                write_error(files[2], f"Invalid request: {e}\n")
+                status = 1
+            else:
+                status = self.server.run(request, Streams(*files), files[2])
+        except OSError:  # Someone else is on the other end, or the client went away
+            return
+        finally:
+            for file in files:
+                try:
+                    file.close()
+                except OSError:  # The client stopped reading, like when it's piped into head
+                    pass
+            for fd in fds:
+                os.close(fd)
+        self.request.sendall(json.dumps({'status': status}).encode())
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str):
+        # The socket goes in a directory only this user can use, so nobody else can take its place.  A shared
+        # directory like /tmp is fine as long as it's sticky, since clients check who they're talking to anyway.
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.stat(directory)
+        if info.st_uid != os.getuid() and not info.st_mode & stat.S_ISVTX:
+            raise PermissionError(f"{directory} belongs to another user.")
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, RunHandler)
+        self.pool = ProgramPool()
+
+    def run(self, request: Dict[str, Any], streams: Streams, stderr) -> int:
+        """Run a program like goif.py would, giving back the exit status."""
+        try:
+            limits = Limits(**request['limits'])
+            key, program = self.pool.take(request['path'], request['cwd'], request['options'])
+            stamps = file_stamps(program)
+        except Exception:  # Errors while compiling come from all over, including the parser
+            write_error(stderr, traceback.format_exc(limit=0))
+            return 1
+
+        # Limits don't change how a program compiles, so they're set for each run
+        program.limits = limits
+        program.streams = streams
+        try:
+            program.run(*request['args'])
+            return 0
+        except (GOIFException, GOIFError) as e:
+            write_error(stderr, f"{type(e).__module__}.{type(e).__name__}: {getattr(e, 'msg', None) or e.name}\n")
+            return 1
+        except Exception:
+            write_error(stderr, traceback.format_exc())
+            return 1
+        finally:
+            try:
+                streams.flush()
+            except OSError:  # The client went away
+                pass
+            program.streams = Streams()
+            self.pool.give_back(key, program, stamps)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else socket_path()
+    with Daemon(path) as daemon:
+        print(f"Serving GOIF on {path}", file=sys.stderr)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
@@ -19,3 +19,13 @@ class GOIFRuntimeError(GOIFError):
     def __init__(self, msg):
         self.msg = msg
         super().__init__(msg)
+
+
+class GOIFLimitError(GOIFRuntimeError):
+    """A run went over one of its limits.  `limit` is the name of that limit, and `usage` is how much the run had
+    used when it stopped."""
+    def __init__(self, msg, limit, usage=None):
+        self.msg = msg
+        self.limit = limit
+        self.usage = usage
+        super().__init__(msg)
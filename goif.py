@@ -3,275 +3,608 @@
 import os.path
 import re
 import sys
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
-
-from pyparsing import ParseException, ParseResults, ParserElement
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
 
 __author__ = "Chase Hult"
 
-from exceptions import GOIFCompileError, GOIFException, GOIFRuntimeError
-from parser_pyp import SpecialValues, cfg_into_stmt, cfg_into_stmt_eval, cfg_code, cfg_expr_var, cfg_go_stmt, \
-    cfg_goif_stmt, cfg_jump_stmt, cfg_line_id, cfg_ret_stmt, cfg_str, cfg_throw_stmt, cfg_unset_var
+from exceptions import GOIFCompileError, GOIFException, GOIFLimitError, GOIFRuntimeError
+from compile_cache import compile_modules, read_module
+from compiler import SUPERINSTRUCTIONS, UNSET, Module, compile_stmt, fold_stmt, fuse_superinstructions, link_stmt, \
+    mark_tail_calls, parse_module, parse_stmt, preserve_strings, set_vars, slot
+from intrinsics import INTRINSICS, Intrinsic
+from limits import CHECK_EVERY, Limits, MemoryMeter, Usage, memory_check_interval
+from profiler import Profiler
+from ropes import flat
+from statements import End, Go, GoGoIf, GoIf, GoIfInto, Into, IntoGo, IntoGoIf, IntoInto, Jump, LineId, Native, \
+    Pending, Return, Stmt, TailJump, Throw, Write
+from streams import Streams
+from tracing import BinaryTraceWriter, DebugTracer, Tracer
 
 
 class Frame(NamedTuple):
-    cur_ln: int
+    pc: int
     cur_file: int
-    vars: Dict[str, Union[bool, str, int]]
+    vars: List[Any]
     handlers: Dict[str, Tuple[int, int]]
+    rets: Optional[Dict[int, Any]] = None  # RET variables set by callers that were tail called away
+    tail: bool = False  # Pushed by a tail call that was given a frame anyway, so it doesn't count toward the depth
 
 
 class GOIF:
-    def __init__(self, fp: Optional[str], *, debug_mode: bool = False, unsafe_jump: bool = False):
+    """A GOIF program and everything needed to run it.
+
+    Instances share no state, so several can compile and run at once in different threads."""
+    def __init__(self, fp: Optional[str], *, debug_mode: bool = False, unsafe_jump: bool = False,
+                 optimize: bool = False, cache: bool = True, intrinsics: bool = True, profile: bool = False,
+                 tail_calls: bool = True, superinstructions: bool = True, lazy: bool = False,
+                 streams: Optional[Streams] = None, limits: Limits = Limits(), processes: Optional[int] = None,
+                 base_dir: Optional[str] = None):
 
         self.cur_file: int = 0
-        self.cur_ln: int = 0
-        self.vars: Dict[str, Union[bool, str, int]] = {}
+        self.pc: int = 0  # Index of the current instruction in self.code[self.cur_file]
+        self.running: bool = False
+        self.vars: List[Any] = []  # Variable values by slot, or UNSET
         self.call_stack: List[Frame] = []
+        self.slots: Dict[str, int] = {}  # Variable names to their index in every frame
+        self.arg1 = slot(self.slots, 'ARG1')
+        self.ret1 = slot(self.slots, 'RET1')
+        # The slot of every ARG and RET variable the code can set, so JUMP and RETURN don't have to search for them
+        self.arg_slots: Set[int] = set()
+        self.ret_slots: Set[int] = {self.ret1}  # Intrinsics set RET1 without a RETURN
+        # How many ret_slots there were, and the slot of each RET variable by number (or None), for call
+        self.ret_order: Tuple[int, List[Optional[int]]] = (0, [])
 
         self.files: Dict[int, Dict[str, int]] = {}  # Per-file file identifiers to file ids
-        self.lines: Dict[int, Dict[int, str]] = {}  # Per-file line numbers to statements
+        # Where paths to the main file and LOADed paths with a directory in them start from
+        self.base_dir = base_dir or os.getcwd()
+        self.code: Dict[int, List[Stmt]] = {}  # Per-file instructions, each ending with End
+        self.line_nos: Dict[int, List[float]] = {}  # Per-file instruction indices to line numbers
+        self.lines: Dict[int, List[str]] = {}  # Per-file instruction indices to statements
         self.labels: Dict[int, Dict[str, int]] = {}  # Per-file line labels to line numbers
-        self.strs: Dict[int, str] = {}  # Preserved strings
+        self.strs: Dict[int, Dict[int, str]] = {}  # Per-file preserved strings
+        self.input_strs: range = range(0)  # The strings in self.strs[1] from the last line typed in
 
         self.debug = debug_mode
+        self.streams = Streams() if streams is None else streams
         self.fid_to_str = {1: os.path.basename(fp or "INPUT"), 2: 'STANDARD LIBRARY'}
 
         self.unsafe_jump = unsafe_jump
+        # Limits apply to each run, and can be changed between runs
+        self.limits = limits
+        self.max_depth: Optional[int] = None if unsafe_jump else 255
+        self.tail_frames = 0  # Frames on the call stack that were pushed by tail calls
+        self.started: float = 0  # When the current run started
+        self.next_memory_check: int = 0  # How many instructions in to measure memory next
+        self.memory_meter = MemoryMeter()
+        self.optimize = optimize
+        self.cache = cache
+        self.processes = processes  # How many processes can compile files at once, or None for one per CPU
+        # Lazy mode only parses and links a file once it's reached, so errors in the rest are never found
+        self.lazy = lazy
+        self.pending: Dict[int, Module] = {}  # Files that haven't been reached yet in lazy mode
+        # Debug mode shows every line that runs, so it always runs the standard library as GOIF
+        self.intrinsics = intrinsics and not debug_mode
+        self.natives: Dict[Tuple[int, int], Intrinsic] = {}  # Standard library routines that can run natively
+        self.tail_calls = tail_calls
+        # Profiling times each line on its own, so it needs every instruction to run by itself
+        self.superinstructions = superinstructions and not debug_mode and not profile
+
+        self.dispatch = {
+            Go: self.exec_go,
+            GoIf: self.exec_goif,
+            Jump: self.exec_jump,
+            Throw: self.exec_throw,
+            Return: self.exec_return,
+            Into: self.exec_into,
+            Write: self.exec_write,
+            Native: self.exec_native,
+            TailJump: self.exec_tail_jump,
+            IntoInto: self.exec_into_into,
+            IntoGoIf: self.exec_into_goif,
+            IntoGo: self.exec_into_go,
+            GoIfInto: self.exec_goif_into,
+            GoGoIf: self.exec_go_goif,
+            Pending: self.exec_pending,
+            End: self.exec_end,
+        }
+
+        # Debug mode shows how deep each line is and profiling times each JUMP, so both give tail calls a frame too
+        if profile:
+            self.dispatch[TailJump] = self.exec_framed_tail_jump
+        self.profiler = Profiler(self) if profile else None
+        self.tracers: List[Tracer] = []
+        if debug_mode:
+            self.add_tracer(DebugTracer(self))
 
         self.fn_map = {}
         self.compile(fp)
 
-        self.cur_ln = self.labels[1]['MAIN']
-        self.cur_file = 1
+        self.cur_file, self.pc = self.resolve_label(1, 1, LineId(None, 'MAIN'))
 
-    def assert_code(self, code) -> None:
-        """Assert that an entire code file is valid.
+    def get_current_state(self, pc: Optional[int] = None, cur_file: Optional[int] = None) -> str:
+        pc = self.pc if pc is None else pc
+        cur_file = self.cur_file if cur_file is None else cur_file
+        return self.describe_line(self.line_nos[cur_file][pc], cur_file)
 
-        This must be done before removing comments and labels, but after preserving strings
-        """
-
-        @cfg_line_id.set_parse_action
-        def throw_on_bad_label(lines, _, pr):
-            ln = len(lines.split("\n"))
-            fname, lid = pr[0]
-            if fname is not None:
-                if fname not in self.files[self.cur_file]:
-                    raise GOIFCompileError(f"Invalid file: '{fname}'."
-                                           + self.get_current_state())
-                c_fid = self.files[self.cur_file][fname]
-            else:
-                c_fid = self.cur_file
-
-            if re.fullmatch(r'[~^]\d+', lid):
-                return
-
-            if lid not in self.labels[c_fid]:
-                raise GOIFCompileError(f"Invalid label: '{fname + ':' if fname else ''}{lid}'."
-                                       + self.get_current_state())
-
-        try:
-            assert cfg_code.parse_string(code) is not None
-        except GOIFCompileError as e:
-            raise e from None
-
-    def get_current_state(self, cur_ln = None, cur_file = None) -> str:
-        cur_ln = cur_ln or self.cur_ln
-        cur_file = cur_file or self.cur_file
-        return f" (line {cur_ln if cur_ln != float('inf') else 'N/A'}," \
-               f" file '{self.fid_to_str[cur_file]}')"
+    def describe_line(self, ln: float, fid: int) -> str:
+        return f" (line {ln if ln != float('inf') else 'N/A'}," \
+               f" file '{self.fid_to_str[fid]}')"
 
     def run(self, *args) -> None:
         self.setup(*args)
         if self.debug:
-            print("Loaded Files:")
-            for fid, fp in self.fid_to_str.items():
-                print(f" {fid} - {fp}")
-            print()
+            loaded = "".join(f" {fid} - {fp}\n" for fid, fp in self.fid_to_str.items())
+            self.streams.write("STDOUT", f"Loaded Files:\n{loaded}\n")
         self._run()
 
-    def _run(self):
-        while self.cur_ln <= max(self.lines[self.cur_file], default=0) or self.call_stack:
-            if self.cur_ln > max(self.lines[self.cur_file], default=0):
-                self.pop_frame()
-                continue
+    def run_returning(self, *args) -> Dict[str, Any]:
+        """Run the program like run and give back the RET variables it finished with, like get_returns.
 
-            if self.cur_ln not in self.lines[self.cur_file]:
-                self.cur_ln += 1
+        MAIN runs as if it were JUMPed to, so RETURNing values from it sets them too."""
+        self.call_target('MAIN')  # Makes the file for MAIN to return to
+        self.setup(*args)
+        self.call_stack = [Frame(-1, 0, [UNSET] * len(self.slots), {})]
+        self._run()
+        return self.get_returns()
+
+    def call(self, label: str, *args) -> Tuple:
+        """JUMP to a routine with these arguments and give back what it RETURNs.
+
+        `label` is written like a JUMP target in the main file, such as "GCD" or "STD:SQRT".  The result has
+        RET1 first, up to the last RET variable that was set, with None for any in between that weren't.  An
+        uncaught GOIF exception is raised as a GOIFException.  STDIN and STDOUT go through `self.streams`, which
+        can be swapped for Streams on in-memory files."""
+        return self.call_many(label, [args])[0]
+
+    def call_many(self, label: str, rows: Iterable[Sequence]) -> List[Tuple]:
+        """Call a routine once for each row of arguments, giving back a list of results like call does.
+
+        The routine is only looked up once, so this is faster than calling call in a loop."""
+        target = self.call_target(label)
+        intrinsic = self.natives.get(target)
+        results = []
+        for args in rows:
+            if any(arg.__class__ not in (int, str, bool) for arg in args):
+                raise TypeError("GOIF arguments must be ints, strings or bools.")
+            # Standard library routines that can run natively don't need the interpreter at all
+            if intrinsic is not None and (ret := intrinsic.fn(args[0] if args else UNSET)) is not None:
+                results.append((ret,))
                 continue
 
-            line = self.lines[self.cur_file][self.cur_ln]
-            try:
-                self.evaluate_statement(line)
-            except GOIFRuntimeError as e:
-                raise GOIFRuntimeError(e.msg + self.get_current_state()) from None
+            arg_slots = self.call_slots(len(args))
+            # Run like a JUMP from an empty frame, which RETURNs to the End of the call file and stops
+            top_vars = [UNSET] * len(self.slots)
+            self.call_stack = [Frame(-1, 0, top_vars, {})]
+            self.vars = [UNSET] * len(self.slots)
+            for index, arg in zip(arg_slots, args):
+                self.vars[index] = arg
+            self.cur_file, self.pc = target
+            self._run()
+            results.append(self.returned())
+        return results
+
+    def call_target(self, label: str) -> Tuple[int, int]:
+        if 0 not in self.code:
+            # A file of its own for calls to return to, so they stop there
+            self.fid_to_str[0] = 'PYTHON'
+            self.code[0], self.line_nos[0], self.lines[0] = [End()], [float('inf')], ['']
+        file_id, _, line_id = label.upper().rpartition(':')
+        return self.resolve_label(1, float('inf'), LineId(file_id or None, line_id))
+
+    def call_slots(self, count: int) -> List[int]:
+        arg_slots = [slot(self.slots, f"ARG{c + 1}") for c in range(count)]
+        if not self.arg_slots.issuperset(arg_slots):
+            self.arg_slots.update(arg_slots)
+            self.grow_frames()
+        return arg_slots
+
+    def returned(self) -> Tuple:
+        """Give back the RET variables in the current namespace as a tuple, like call does."""
+        if self.ret_order[0] != len(self.ret_slots):
+            numbers = {int(name[3:]): index for name, index in self.slots.items() if index in self.ret_slots}
+            self.ret_order = (len(self.ret_slots), [numbers.get(c) for c in range(1, max(numbers) + 1)])
+        rets = [UNSET if index is None else self.vars[index] for index in self.ret_order[1]]
+        while rets and rets[-1] is UNSET:
+            rets.pop()
+        return tuple(None if ret is UNSET else flat(ret) for ret in rets)
+
+    def _run(self):
+        code = self.code
+        dispatch = self.dispatch
+        self.running = True
+        limits = self.limits
+        self.max_depth = limits.depth if limits.depth is not None else None if self.unsafe_jump else 255
+        self.tail_frames = sum(frame.tail for frame in self.call_stack)
+        self.started = time.monotonic()
+        self.next_memory_check = 0
+        self.memory_meter = MemoryMeter()
+        count = 0  # Instructions run so far
+        try:
+            while self.running:
+                # Limits are only checked between batches of instructions, so counting them is almost free
+                stop = count + self.check_limits(count)
+                # Superinstructions give back 2 when they run both of their instructions, so a pair counts as two
+                while count < stop - 1 and self.running:
+                    stmt = code[self.cur_file][self.pc]
+                    try:
+                        count += dispatch[stmt.__class__](stmt) or 1
+                    except GOIFException as exc:
+                        # The second of a pair threw if the pair got as far as moving on from its first
+                        count += 2 if stmt.__class__ in SUPERINSTRUCTIONS and code[self.cur_file][self.pc] is not stmt \
+                            else 1
+                        self.throw_exc(exc.name)
+                if count < stop and self.running:
+                    # Only the first of a pair runs right before a check, so the count never goes past it
+                    stmt = code[self.cur_file][self.pc]
+                    try:
+                        dispatch[SUPERINSTRUCTIONS.get(stmt.__class__, stmt.__class__)](stmt)
+                    except GOIFException as exc:
+                        self.throw_exc(exc.name)
+                    count += 1
+        except GOIFLimitError as e:
+            usage = self.usage(count)
+            msg = f"{e.msg} after {usage}."
+            if e.limit == 'depth' and limits.depth is None:
+                msg += " Possible infinite loop? Run with unsafe_jump (-j) if this is intended."
+            raise GOIFLimitError(msg + self.get_current_state(), e.limit, usage) from None
+        except GOIFRuntimeError as e:
+            raise GOIFRuntimeError(e.msg + self.get_current_state()) from None
+        finally:
+            self.streams.flush()
+
+    def check_limits(self, count: int) -> int:
+        """Raise a GOIFLimitError if this run has gone over a limit after `count` instructions.
+
+        Gives back how many instructions can run before the next check."""
+        limits = self.limits
+        if limits.seconds is not None and time.monotonic() - self.started >= limits.seconds:
+            raise GOIFLimitError(f"Time limit of {limits.seconds} seconds reached", 'seconds')
+        batch = CHECK_EVERY
+        if limits.memory is not None:
+            if count >= self.next_memory_check:
+                memory = self.memory_meter.measure(self.call_stack, self.vars)
+                if memory > limits.memory:
+                    raise GOIFLimitError(f"Memory limit of {limits.memory} bytes reached", 'memory')
+                self.next_memory_check = count + memory_check_interval(memory, limits.memory)
+            batch = min(batch, self.next_memory_check - count)
+        if limits.instructions is not None:
+            if count >= limits.instructions:
+                raise GOIFLimitError(f"Instruction limit of {limits.instructions} reached", 'instructions')
+            batch = min(batch, limits.instructions - count)
+        return batch
+
+    def usage(self, count: int) -> Usage:
+        return Usage(count, len(self.call_stack) - self.tail_frames,
+                     self.memory_meter.measure(self.call_stack, self.vars), time.monotonic() - self.started)
 
     def evaluate_input(self, line) -> None:
-        line = self.preserve_strings(line)
-        self.cur_ln = float('inf')
+        # Input lines run from a scratch area after the End of file 1, so they can still GO into it.  Nothing can
+        # GO into the scratch area, so the last line typed in and its strings can go.
+        end = bisect_left(self.line_nos[1], float('inf'))
+        del self.code[1][end + 1:], self.line_nos[1][end + 1:], self.lines[1][end + 1:]
+        strs = self.strs[1]
+        for idx in self.input_strs:
+            del strs[idx]
+        start = max(strs, default=0) + 1
+        line = preserve_strings(line, strs)
+        self.input_strs = range(start, max(strs, default=0) + 1)
+
+        if (match := re.fullmatch(r'\s*LOAD\s+(\S+)\s+(\S+)\s*', line, re.I)):
+            # This is a LOAD statement.  We need to handle this specially.
+            self.files[1][match.group(2).upper()] = self.compile(match.group(1))
+            return
+
+        line = re.sub(r'\s+', ' ', line.split('%')[0].strip().upper())
+        self.cur_file, self.pc = 1, end + 1
         try:
-            if (match := re.fullmatch(r'\s*LOAD\s+(\S+)\s+(\S+)\s*', line, re.I)):
-                # This is a LOAD statement.  We need to handle this specially.
-                self.files[1][match.group(2).upper()] = self.compile(match.group(1))
-            else:
-                line = re.sub(r'\s+', ' ', line.split('%')[0].strip().upper())
-                self.evaluate_statement(line)
+            stmt = self.lower_statement(parse_stmt(line), 1, float('inf'))
         except GOIFRuntimeError as e:
-            e.msg += self.get_current_state()
-            raise e from None
+            # The line isn't in the scratch area yet, so describe it directly
+            raise GOIFRuntimeError(e.msg + self.describe_line(float('inf'), 1)) from None
+        if stmt is None:
+            return
+        self.code[1] += [stmt, End()]
+        self.grow_frames()
+        self.line_nos[1] += [float('inf'), float('inf')]
+        self.lines[1] += [line, '']
         self._run()
 
-    def evaluate_statement(self, line):
-        """Evaluate one GOIF statement."""
-        if self.debug:
-            print(f"[{len(self.call_stack) + 1}]"
-                  f" #{self.cur_file}{'-' + str(self.cur_ln) if self.cur_ln != float('inf') else ''}:"
-                  f" {self.restore_string(line, keep_quotes=True)}")
-
-        if (tokens := self.try_match(cfg_go_stmt, line)):
-            # GO
-            label, = tokens
-            self.cur_file, self.cur_ln = self.label_to_ln(label)
-        elif (tokens := self.try_match(cfg_goif_stmt, line)):
-            # GOIF
-            if isinstance(tokens, GOIFException):
-                exc = tokens
-                self.throw_exc(exc.name)
-            elif isinstance(tokens, ParseResults):
-                label, expr = tokens
-                if not isinstance(expr, bool):
-                    raise GOIFRuntimeError(f"GOIF expression does not evaluate to bool."
-                                           + self.get_current_state())
-
-                if expr:
-                    self.cur_file, self.cur_ln = self.label_to_ln(label)
-                else:
-                    self.cur_ln += 1
-        elif (tokens := self.try_match(cfg_jump_stmt, line)):
-            # JUMP
-            label, args, *handlers = tokens
-            self.push_frame(args, handlers)
-            self.cur_file, self.cur_ln = self.label_to_ln(label)
-        elif (tokens := self.try_match(cfg_throw_stmt, line)):
-            # THROW
-            exception, = tokens
-            self.throw_exc(exception)
-        elif (tokens := self.try_match(cfg_ret_stmt, line)):
-            # RETURN
-            rets, = tokens
-            self.pop_frame(rets)
-        elif self.try_match(cfg_into_stmt_eval, line):
-            # INTO
-            try:
-                tokens = self.try_match(cfg_into_stmt, line)
-            except GOIFRuntimeError as e:
-                raise GOIFRuntimeError(e.msg + self.get_current_state()) from None
-
-            if isinstance(tokens, GOIFException):
-                exc = tokens
-                self.throw_exc(exc.name)
-            else:
-                expr, var = tokens
-                if self.debug:
-                    if expr is SpecialValues.Empty:
-                        print(f"Unsetting {var}.")
-                    else:
-                        print(f"Storing {repr(expr)} into {var}.")
-                self.set_variable(var, expr)
-                self.cur_ln += 1
+    def lower_statement(self, stmt: Stmt, fid: int, ln: float) -> Optional[Stmt]:
+        """Turn a statement from line `ln` of file `fid` into an instruction with compiled expressions and labels.
+
+        Labels are checked before folding, so even a statement that's optimized away gives back None only if
+        everything it refers to exists."""
+        stmt = link_stmt(stmt, lambda label: self.resolve_label(fid, ln, label))
+        for var in set_vars(stmt):
+            if re.fullmatch(r'ARG\d+', var):
+                self.arg_slots.add(slot(self.slots, var))
+            elif re.fullmatch(r'RET\d+', var):
+                self.ret_slots.add(slot(self.slots, var))
+        if self.optimize and (stmt := fold_stmt(stmt, self.strs[fid])) is None:
+            return None
+        stmt = compile_stmt(stmt, self.strs[fid], self.slots)
+        if stmt.__class__ is Jump and stmt.target in self.natives:
+            stmt = Native(*stmt, self.natives[stmt.target])
+        return stmt
+
+    def exec_go(self, stmt: Go) -> None:
+        self.cur_file, self.pc = stmt.target
+
+    def exec_goif(self, stmt: GoIf) -> None:
+        expr = stmt.cond(self)
+        if expr is True:
+            self.cur_file, self.pc = stmt.target
+        elif expr is False:
+            self.pc += 1
         else:
-            raise GOIFRuntimeError(f"Invalid statement: {repr(line)}."
-                                   + self.get_current_state()) from None
-
-        if self.debug and isinstance(tokens, GOIFException):
-            exc = tokens
-            print(f"Failed expression.  Throwing {exc.name}")
+            raise GOIFRuntimeError("GOIF expression does not evaluate to bool.")
+
+    def exec_jump(self, stmt: Jump) -> None:
+        self.push_frame([(index, arg(self)) for index, arg in stmt.args], stmt.handlers)
+        self.cur_file, self.pc = stmt.target
+
+    def exec_throw(self, stmt: Throw) -> None:
+        raise GOIFException(stmt.exception)
+
+    def exec_return(self, stmt: Return) -> None:
+        self.pop_frame([(index, ret(self)) for index, ret in stmt.rets])
+
+    def exec_into(self, stmt: Into) -> None:
+        self.vars[stmt.var] = stmt.expr(self)
+        self.pc += 1
+
+    def exec_write(self, stmt: Write) -> None:
+        value = stmt.expr(self)
+        if stmt.stream == "STDIN":
+            raise GOIFRuntimeError(f"You cannot read from {stmt.stream}.")
+        self.streams.write(stmt.stream, str(value))
+        self.pc += 1
+
+    def exec_native(self, stmt: Native) -> None:
+        args = [(index, arg(self)) for index, arg in stmt.args]
+        if self.max_depth is None or len(self.call_stack) - self.tail_frames + stmt.intrinsic.depth <= self.max_depth:
+            # This is the ARG1 that the routine would see.  Intrinsics don't accept UNSET.
+            arg1 = args[0][1] if args else self.vars[self.arg1]
+            if (ret := stmt.intrinsic.fn(arg1)) is not None:
+                self.vars[self.ret1] = ret
+                self.pc += 1
+                return
+        self.push_frame(args, stmt.handlers)
+        self.cur_file, self.pc = stmt.target
 
-    def label_to_ln(self, label) -> Tuple[int, int]:
-        """Convert a label identifier to a file id and line number.."""
+    def exec_tail_jump(self, stmt: TailJump) -> None:
+        args = [(index, arg(self)) for index, arg in stmt.args]
+        if not self.call_stack:
+            # The program ends at the RETURN, and its RET variables have to be there when it does
+            self.push_frame(args, {})
+        else:
+            # The RETURN would have passed on the RET variables set so far, unless the callee's replaced them
+            cur_vars = self.vars
+            caller = self.call_stack[-1]
+            rets = {index: cur_vars[index] for index in self.ret_slots if cur_vars[index] is not UNSET}
+            if rets:
+                self.call_stack[-1] = caller._replace(rets={**caller.rets, **rets} if caller.rets else rets)
+            self.vars = self.new_vars(cur_vars, args)
+        self.cur_file, self.pc = stmt.target
+
+    def exec_framed_tail_jump(self, stmt: TailJump) -> None:
+        """Run a tail call like a JUMP, for when every frame has to be seen.  The frame doesn't count toward the
+        depth limit, since the program wouldn't be any deeper without it."""
+        self.push_frame([(index, arg(self)) for index, arg in stmt.args], {}, True)
+        self.cur_file, self.pc = stmt.target
+
+    def exec_into_into(self, stmt: IntoInto) -> int:
+        # Only JUMP and RETURN change the namespace
+        cur_vars = self.vars
+        cur_vars[stmt.var] = stmt.expr(self)
+        self.pc += 1
+        cur_vars[stmt.var2] = stmt.expr2(self)
+        self.pc += 1
+        return 2
+
+    def exec_into_goif(self, stmt: IntoGoIf) -> int:
+        self.vars[stmt.var] = stmt.expr(self)
+        self.pc += 1
+        expr = stmt.cond(self)
+        if expr is True:
+            self.cur_file, self.pc = stmt.target
+        elif expr is False:
+            self.pc += 1
+        else:
+            raise GOIFRuntimeError("GOIF expression does not evaluate to bool.")
+        return 2
+
+    def exec_into_go(self, stmt: IntoGo) -> int:
+        self.vars[stmt.var] = stmt.expr(self)
+        self.cur_file, self.pc = stmt.target
+        return 2
+
+    def exec_goif_into(self, stmt: GoIfInto) -> Optional[int]:
+        expr = stmt.cond(self)
+        if expr is True:
+            self.cur_file, self.pc = stmt.target
+        elif expr is False:
+            self.pc += 1
+            self.vars[stmt.var] = stmt.expr(self)
+            self.pc += 1
+            return 2
+        else:
+            raise GOIFRuntimeError("GOIF expression does not evaluate to bool.")
+
+    def exec_go_goif(self, stmt: GoGoIf) -> int:
+        self.cur_file, self.pc = stmt.target
+        expr = stmt.cond(self)
+        if expr is True:
+            self.cur_file, self.pc = stmt.target2
+        elif expr is False:
+            self.pc += 1
+        else:
+            raise GOIFRuntimeError("GOIF expression does not evaluate to bool.")
+        return 2
+
+    def exec_pending(self, stmt: Pending) -> None:
+        """Compile the current file the first time it's reached.  It runs from the same place once it's done."""
+        fid = self.cur_file
+        code = self.lower_module(fid, parse_module(self.pending[fid], self.fid_to_str[fid]))
+        # Interactive mode keeps lines typed in after file 1's End, so only replace the file itself
+        self.code[fid][:len(code)] = code
+        del self.pending[fid]
+        self.grow_frames()
+
+    def exec_end(self, stmt: End) -> None:
+        self.pop_frame()
+
+    def add_tracer(self, tracer: Tracer) -> None:
+        """Send every event from now on to `tracer` as well.
+
+        The interpreter only looks for tracers once one has been added, by wrapping the dispatch table and the
+        methods that change frames, so a program that isn't being traced pays nothing."""
+        self.tracers.append(tracer)
+        if len(self.tracers) > 1:
+            return
+        tracers = self.tracers
+        # Tracers are told about every frame pushed and popped, so tail calls get a frame of their own too
+        self.dispatch[TailJump] = self.exec_framed_tail_jump
+
+        def traced(fn):
+            def traced_fn(stmt):
+                for t in tracers:
+                    t.line(self.cur_file, self.pc, stmt)
+                fn(stmt)
+
+            return traced_fn
+
+        def storing(fn, name):
+            def storing_fn(stmt):
+                value = stmt.expr(self)
+                for t in tracers:
+                    t.store(name(stmt), value)
+                fn(stmt._replace(expr=lambda g: value))
+
+            return storing_fn
+
+        self.dispatch[Into] = storing(self.dispatch[Into], lambda stmt: self.var_name(stmt.var))
+        self.dispatch[Write] = storing(self.dispatch[Write], lambda stmt: stmt.stream)
+        # Tracers see every line, so superinstructions only run their first instruction from now on.  Their fields
+        # are named like that instruction's, so they go through the same wrappers.
+        for cls, first in SUPERINSTRUCTIONS.items():
+            self.dispatch[cls] = self.dispatch[first]
+        for cls, fn in self.dispatch.items():
+            if cls is not Pending:  # Compiling a file isn't an instruction
+                self.dispatch[cls] = traced(fn)
+
+        push_frame, pop_frame, throw_exc = self.push_frame, self.pop_frame, self.throw_exc
+
+        def traced_push_frame(*args):
+            fid, pc = self.cur_file, self.pc
+            push_frame(*args)
+            for t in tracers:
+                t.push(fid, pc)
+
+        def traced_pop_frame(*args):
+            depth = len(self.call_stack)
+            pop_frame(*args)
+            if len(self.call_stack) < depth:
+                for t in tracers:
+                    t.pop(self.cur_file, self.pc)
+
+        def traced_throw_exc(exc):
+            explicit = self.code[self.cur_file][self.pc].__class__ is Throw
+            for t in tracers:
+                t.throw(exc, explicit)
+            throw_exc(exc)
+            for t in tracers:
+                t.handle(exc, self.cur_file, self.pc)
+
+        self.push_frame, self.pop_frame, self.throw_exc = traced_push_frame, traced_pop_frame, traced_throw_exc
+
+    def resolve_label(self, fid: int, ln: float, label: LineId) -> Tuple[int, int]:
+        """Convert a label identifier used on line `ln` of file `fid` to a file id and instruction index."""
         file_id, line_id = label
         if file_id is None:
-            file = self.cur_file
+            file = fid
+        elif file_id in self.files[fid]:
+            file = self.files[fid][file_id]
         else:
-            file = self.files[self.cur_file][file_id]
+            raise GOIFCompileError(f"Invalid file: '{file_id}'." + self.describe_line(ln, fid))
 
         if line_id.startswith("^"):  # Absolute
-            return file, int(line_id[1:])
-        if line_id.startswith("~"):  # Relative
-            return file, self.cur_ln + int(line_id[1:])
-        if line_id in self.labels[file]:  # Line Label
-            return file, self.labels[file][line_id]
-        raise GOIFCompileError(f"Invalid label '{line_id}'."
-                               + self.get_current_state())
-
-    def set_variable(self, var: str, value: Any) -> None:
-        """Set a GOIF variable to the current namespace.
-
-        This is used in INTO statements."""
-        if value is SpecialValues.Empty:
-            if var in self.vars:
-                self.vars.pop(var)
-        elif var == "STDERR":
-            sys.stderr.write(str(value))
-        elif var == "STDOUT":
-            sys.stdout.write(str(value))
-        elif var in ("STDIN",):
-            raise GOIFRuntimeError(f"You cannot read from {var}."
-                                   + self.get_current_state())
+            line = int(line_id[1:])
+        elif line_id.startswith("~"):  # Relative
+            line = ln + int(line_id[1:])
+        elif line_id in self.labels[file]:  # Line Label
+            line = self.labels[file][line_id]
         else:
-            self.vars[var] = value
-
-    def get_variable(self, pr: ParseResults) -> Any:
-        """Get a GOIF variable from the current namespace.
-
-        This is used in expressions."""
-        var = pr[0]
-        if var == "STDIN":
-            return input()
-        elif var in ("STDOUT", "STDERR"):
-            raise GOIFRuntimeError(f"You cannot write to {var}."
-                                   + self.get_current_state())
-        elif var in self.vars:
-            return self.vars[var]
-        raise GOIFRuntimeError(f"Unknown variable {var}."
-                               + self.get_current_state())
-
-    def push_frame(self, args: List, handlers: List[ParseResults]) -> None:
+            raise GOIFCompileError(f"Invalid label: '{file_id + ':' if file_id else ''}{line_id}'."
+                                   + self.describe_line(ln, fid))
+        # Blank lines, comments and labels fall through to the next instruction
+        return file, bisect_left(self.line_nos[file], line)
+
+    def get_returns(self) -> Dict[str, Any]:
+        """Get the RET variables that are set in the current namespace, in order."""
+        names = list(self.slots)
+        rets = sorted(self.ret_slots, key=lambda index: int(names[index][3:]))
+        return {names[index]: flat(self.vars[index]) for index in rets if self.vars[index] is not UNSET}
+
+    def var_name(self, index: int) -> str:
+        return list(self.slots)[index]  # Slots are handed out in order
+
+    def grow_frames(self) -> None:
+        """Give every frame slots for variables that were first compiled after it was made."""
+        missing = len(self.slots) - len(self.vars)
+        if missing:
+            for frame_vars in [self.vars] + [frame.vars for frame in self.call_stack]:
+                frame_vars.extend([UNSET] * missing)
+
+    def push_frame(self, args: List[Tuple[int, Any]], handlers: Dict[str, Tuple[int, int]], tail: bool = False) -> None:
         """Push the current frame onto the call stack.
 
-        This is called in a JUMP statement"""
-        if len(self.call_stack) >= 255 and not self.unsafe_jump:
-            raise GOIFRuntimeError("Call stack overflow. Possible infinite loop?"
-                                   " Run with unsafe_jump (-j) if this is intended.")
-        handlers = {exc: self.label_to_ln(ln) for exc, ln in handlers}
-        self.call_stack.append(Frame(self.cur_ln, self.cur_file, self.vars.copy(), handlers))
+        This is called in a JUMP statement, or a tail call that gets a frame anyway."""
+        if tail:
+            self.tail_frames += 1
+        elif self.max_depth is not None and len(self.call_stack) - self.tail_frames >= self.max_depth:
+            raise GOIFLimitError(f"Call depth limit of {self.max_depth} reached", 'depth')
+        # The callee always gets a new namespace, so the caller's can be saved as is
+        cur_vars = self.vars
+        self.call_stack.append(Frame(self.pc, self.cur_file, cur_vars, handlers, None, tail))
+        self.vars = self.new_vars(cur_vars, args)
+
+    def new_vars(self, cur_vars: List[Any], args: List[Tuple[int, Any]]) -> List[Any]:
+        """Make the namespace for a JUMP, which gets the caller's ARG variables if there are no arguments."""
+        new_vars = [UNSET] * len(cur_vars)
         if not args:
-            for var in self.vars.copy():
-                if not re.fullmatch(r'ARG\d+', var):
-                    self.vars.pop(var)
+            for index in self.arg_slots:
+                new_vars[index] = cur_vars[index]
         else:
-            self.vars = {}
-            for c, arg in enumerate(args, 1):
-                self.vars[f'ARG{c}'] = arg
+            for index, arg in args:
+                new_vars[index] = arg
+        return new_vars
 
-    def pop_frame(self, rets: Optional[ParseResults] = None) -> None:
+    def pop_frame(self, rets: Optional[List[Tuple[int, Any]]] = None) -> None:
         """Pop from the call stack
 
         This is called in a RETURN statement or when a file is over."""
         if not self.call_stack:
-            self.cur_ln = float('inf')
+            self.running = False
             return
         frame = self.call_stack.pop()
+        if frame.tail:
+            self.tail_frames -= 1
         self.cur_file = frame.cur_file
-        self.cur_ln = frame.cur_ln + 1
+        self.pc = frame.pc + 1
         cur_vars = frame.vars
+        if frame.rets:
+            for index, ret in frame.rets.items():
+                cur_vars[index] = ret
         if not rets:
-            for var, val in self.vars.copy().items():
-                if re.fullmatch(r'RET\d+', var):
-                    cur_vars[var] = val
+            for index in self.ret_slots:
+                if self.vars[index] is not UNSET:
+                    cur_vars[index] = self.vars[index]
         else:
-            for c, ret in enumerate(rets, 1):
-                cur_vars[f"RET{c}"] = ret
+            for index, ret in rets:
+                cur_vars[index] = ret
         self.vars = cur_vars
 
     def throw_exc(self, exc: str) -> None:
@@ -279,51 +612,49 @@ class GOIF:
 
         This is called on some bad expressions or in an explicit THROW statement"""
         if exc == "ERROR":
-            raise GOIFRuntimeError("ERROR thrown." + self.get_current_state())
-        jumps = ""
-        while self.call_stack:
-            frame = self.call_stack.pop()
-            jumps += f" from JUMP{self.get_current_state(frame.cur_ln, frame.cur_file)}"
+            raise GOIFRuntimeError("ERROR thrown.")
+        # Find the handler before popping anything, so a handled exception never formats where it came from
+        call_stack = self.call_stack
+        for depth in range(len(call_stack) - 1, -1, -1):
+            frame = call_stack[depth]
             if exc in frame.handlers:
-                self.cur_file, self.cur_ln = frame.handlers[exc]
+                del call_stack[depth:]
+                if self.tail_frames:
+                    self.tail_frames = sum(frame.tail for frame in call_stack)
+                self.cur_file, self.pc = frame.handlers[exc]
                 self.vars = frame.vars
                 return
+        # Frames returning to file 0 are where Python started the program, not JUMPs
+        jumps = "".join(f" from JUMP{self.get_current_state(frame.pc, frame.cur_file)}"
+                        for frame in reversed(call_stack) if frame.cur_file)
+        call_stack.clear()
+        self.tail_frames = 0
         raise GOIFException(exc + self.get_current_state() + jumps)
 
     def setup(self, *args) -> None:
-        """This resets everything to run a file again which is no longer supported due to ease of command line use."""
-        self.cur_file = 1
-        self.cur_ln = self.labels[1]['MAIN']
-        self.vars = {f"ARG{c + 1}": str(arg) for c, arg in enumerate(args)}
-        cfg_str.set_parse_action(self.restore_string)
-        cfg_expr_var.set_parse_action(self.get_variable)
-        cfg_unset_var.set_parse_action(lambda pr: pr[0] not in self.vars)
-
-    def try_match(self, cfg: ParserElement, string: str) -> Union[ParseResults, GOIFException, None]:
-        """PyParsing raises an exception instead of just failing on an invalid parse.  This fixes that."""
-        try:
-            return cfg.parse_string(string, parse_all=True)
-        except GOIFException as e:
-            return e
-        except ParseException:
-            return None
-        except GOIFRuntimeError as e:
-            raise GOIFRuntimeError(e.msg + self.get_current_state()) from None
+        """Reset everything to run the program from the start with new arguments."""
+        self.cur_file, self.pc = self.resolve_label(1, 1, LineId(None, 'MAIN'))
+        self.call_stack = []
+        arg_slots = [slot(self.slots, f"ARG{c + 1}") for c in range(len(args))]
+        self.arg_slots.update(arg_slots)
+        self.vars = [UNSET] * len(self.slots)
+        for index, arg in zip(arg_slots, args):
+            self.vars[index] = str(arg)
 
     def compile(self, root: Optional[str]) -> int:
         """Compile a GOIF file.
 
         The return value is the FId of the root which is 1 unless we're in interactive mode.
         """
-        root = os.path.abspath(root) if root is not None else None
+        root = self.resolve_path(root) if root is not None else None
         if root in self.fn_map:
             return self.fn_map[root]
 
-        codes = {}
+        modules = {}
 
         idx = max(self.files, default=0) + 2
 
-        fp_root = os.path.dirname(root) if root is not None else ''
+        fp_root = os.path.dirname(root) if root is not None else self.base_dir
         std = os.path.abspath(os.path.join(os.path.dirname(__file__), 'std.goif'))
 
         seen = set(self.fn_map.values())
@@ -331,103 +662,97 @@ class GOIF:
         if idx == 2:  # Don't overwrite the standard library
             idx += 1
 
-        files = {root, std}
+        # Files are handled in the order they're found, so file ids and errors are the same every time
+        files = [root, std]
+        to_compile = []
         while files:
-            fp = files.pop()
+            fp = files.pop(0)
             fid = self.fn_map[fp]
             if fp is None and fid == 1:
                 # We're in interactive mode, so we don't have a MAIN file!
                 self.files[1] = {"MAIN": 1, "STD": 2}
-                self.lines[1] = {}
+                self.code[1] = [End()]
+                self.line_nos[1] = [float('inf')]
+                self.lines[1] = ['']
                 self.labels[1] = {'MAIN': 1}
+                self.strs[1] = {}
                 continue
 
-            if "/" not in fp:
-                # Unless specified, we assume all modules are in the same directory as MAIN
-                fp = os.path.join(fp_root, fp)
-
-            fp = os.path.abspath(fp)
             if fp in seen:
                 continue
             seen.add(fp)
 
-            # Prepare the curretn code file for parsing
-            code = self.preserve_strings(open(fp).read())
-            codes[fid] = code  # We keep a copy of the code to check for validity later
-            code, links = self.get_files(code)
+            # Files that haven't changed since they were last compiled come straight from the cache.  The rest are
+            # only outlined for now, which is enough to find the files they load.
+            code, module = read_module(fp, self.fid_to_str.get(fid), cache=self.cache)
+            modules[fid] = module
+            if module.stmts is None and not self.lazy:
+                to_compile.append((fid, fp, code))
 
             # Add all loads to our queue.
             self.files[fid] = {"MAIN": 1, "STD": 2}
-            for fid_link, fp_link in links.items():
-                fp_link = os.path.join(fp_root, fp_link) if "/" not in fp_link else fp_link
+            for fid_link, fp_link in module.links.items():
+                # Unless specified, we assume all modules are in the same directory as MAIN
+                fp_link = self.resolve_path(os.path.join(fp_root, fp_link) if "/" not in fp_link else fp_link)
                 if fp_link not in self.fn_map:
                     self.fn_map[fp_link] = idx
                     self.fid_to_str[idx] = os.path.basename(fp_link)
                     idx += 1
                 self.files[fid][fid_link] = self.fn_map[fp_link]
-                files.add(fp_link)
-
-            # Parsing step for lines and labels
-            f_lines = {}
-            f_labels = {}
-            for ln, line in enumerate(code.split('\n'), 1):
-                line = line.split('%')[0].strip().upper()
-                if line.endswith(':'):
-                    label = line[:-1]
-                    if label in f_labels:
-                        raise GOIFCompileError(f"Label '{label}' appeared at least twice in file {self.fid_to_str[fid]}"
-                                               f" (lines {f_labels[label]} and {ln})")
-                    if not re.fullmatch(r'[\w.]+', label):
-                        raise GOIFCompileError(f"Invalid label name in file {self.fid_to_str[idx]}: '{label}'")
-                    f_labels[label] = ln
-                    continue
-                if line:
-                    line = re.sub(r'\s+', ' ', line)
-                    f_lines[ln] = line
-            f_labels.setdefault('MAIN', 1)
-            self.lines[fid] = f_lines
-            self.labels[fid] = f_labels
-
-        # Check all files compiletime to make sure they're all valid
-        for fid, code in codes.items():
-            self.cur_file = fid
-            self.assert_code(code)
+                files.append(fp_link)
+
+        # Parsing and validating is most of the work, so every file that needs it is done at once
+        compiled = compile_modules([(fp, code, self.fid_to_str.get(fid)) for fid, fp, code in to_compile],
+                                   cache=self.cache, processes=self.processes)
+        for (fid, _, _), module in zip(to_compile, compiled):
+            modules[fid] = module
+        for fid, module in modules.items():
+            self.labels[fid] = module.labels
+            self.strs[fid] = module.strs
+
+        # Work out where every instruction goes first, since labels can point into any file.  Lazy modules keep
+        # every statement, since they aren't parsed yet.
+        for fid, module in modules.items():
+            kept = [ln for ln in module.lines if self.lazy or not self.optimize
+                    or fold_stmt(module.stmts[ln], module.strs) is not None]
+            self.line_nos[fid] = kept + [float('inf')]
+            self.lines[fid] = [module.lines[ln] for ln in kept] + ['']
+        if self.intrinsics:
+            self.natives = {self.resolve_label(2, 1, LineId(None, label)): intrinsic
+                            for label, intrinsic in INTRINSICS.items() if label in self.labels[2]}
+
+        # Lower every file to a flat list of instructions, checking labels on the way
+        for fid, module in modules.items():
+            if self.lazy:
+                self.code[fid] = [Pending()] * len(module.lines) + [End()]
+                self.pending[fid] = module
+            else:
+                self.code[fid] = self.lower_module(fid, module)
+        self.grow_frames()
         self.cur_file = 1
         return self.fn_map[root]
 
-    def preserve_strings(self, code: str) -> str:
-        """Replace strings in a file with an identifier to recall them later.  This makes parsing easier."""
-        idx = max(self.strs, default=0) + 1
-
-        def replace_and_increment(match) -> str:
-            nonlocal idx
-            self.strs[idx] = match.group(1).replace('\\n', '\n').replace('\\t', '\t') \
-                .replace('\\"', '"').replace('\\0', '\0')
-            idx += 1
-            return f'"{idx - 1}"'
-
-        # Honestly, this is probably regular.  I'm too lazy to write w/o lookbehinds though.
-        code = re.sub(r'(?<!\\)"((?:[^"\n]|(?<=\\)")*)(?<!\\)"', replace_and_increment, code)
+    def resolve_path(self, fp: str) -> str:
+        """Get the absolute path to a file, starting from base_dir if it's relative."""
+        return os.path.normpath(os.path.join(self.base_dir, fp))
+
+    def lower_module(self, fid: int, module: Module) -> List[Stmt]:
+        lowered = [self.lower_statement(stmt, fid, ln) for ln, stmt in module.stmts.items()]
+        if self.lazy:
+            # The instructions were laid out before anything could be folded away, so keep their places
+            lowered = [stmt or Go((fid, pc + 1)) for pc, stmt in enumerate(lowered)]
+        code = [stmt for stmt in lowered if stmt is not None] + [End()]
+        if self.tail_calls:
+            code = mark_tail_calls(code)
+        if self.superinstructions:
+            code = fuse_superinstructions(code, fid)
         return code
 
-    def get_files(self, code: str) -> Tuple[str, Dict[str, str]]:
-        """Get the loaded files out of a code block"""
-        files = {}
-
-        def save_file(match) -> str:
-            files[match.group(2).upper()] = match.group(1)
-            return ""
-
-        code = re.sub(r'^\s*LOAD\s+(\S+)\s+(\S+)\s*$', save_file, code, flags=re.I + re.M)
-        return code, files
-
-    def restore_string(self, line: Union[str, ParseResults], *, keep_quotes=False) -> str:
-        """Recall a preserved string identifier"""
-        if isinstance(line, ParseResults):
-            line = line[0]
+    def restore_string(self, line: str, fid: int, *, keep_quotes=False) -> str:
+        """Recall a preserved string identifier from file `fid`"""
 
         def restore(match):
-            string = self.strs[int(match.group(1))]
+            string = self.strs[fid][int(match.group(1))]
             if keep_quotes:
                 string = repr(string)
             return string
@@ -436,31 +761,75 @@ class GOIF:
 
 
 if __name__ == "__main__":
-    offset = 0
-    interactive = debug = ujump = False
-    if len(sys.argv) > 1 and sys.argv[1].startswith("-"):
-        flags = sys.argv[1]
-        offset = 1
-        if 'i' in flags:
-            interactive = True
-        if 'd' in flags:
-            debug = True
-        if 'j' in flags:
-            ujump = True
-
-    if not sys.argv[1 + offset:] and not interactive:
-        print("Usage:\n goif.py [-dij] path/to/file.goif [arg ...]\n goif.py -i[dj]")
+    argv = sys.argv[1:]
+    interactive = debug = ujump = optimize = profile = trace = lazy = False
+    cache = intrinsics = True
+    limits = {}
+    flags = ""
+    usage = "Usage:\n goif.py [-cdijlnopt] [--limit=value ...] path/to/file.goif [arg ...]\n" \
+            " goif.py -i[cdjlnop] [--limit=value ...]\n" \
+            "Limits: --instructions=N --depth=N --memory=BYTES --seconds=S"
+    while argv and argv[0].startswith("-"):
+        arg = argv.pop(0)
+        if not arg.startswith("--"):
+            flags += arg[1:]
+            continue
+        # Limits have values, so they're given separately, like --seconds=10
+        name, _, value = arg[2:].partition("=")
+        if name not in Limits._fields or not re.fullmatch(r'\d+(\.\d*)?' if name == 'seconds' else r'\d+', value):
+            print(usage)
+            exit(1)
+        limits[name] = float(value) if name == 'seconds' else int(value)
+    if 'i' in flags:
+        interactive = True
+    if 'd' in flags:
+        debug = True
+    if 'j' in flags:
+        ujump = True
+    if 'o' in flags:
+        optimize = True
+    if 'c' in flags:
+        cache = False
+    if 'n' in flags:
+        intrinsics = False
+    if 'p' in flags:
+        profile = True
+    if 't' in flags:
+        trace = True
+    if 'l' in flags:
+        lazy = True
+
+    if not argv and not interactive:
+        print(usage)
         exit(1)
 
+    options = dict(debug_mode=debug, unsafe_jump=ujump, optimize=optimize, cache=cache, intrinsics=intrinsics,
+                   profile=profile, lazy=lazy, limits=Limits(**limits))
     if not interactive:
-        goif_code = GOIF(sys.argv[1 + offset], debug_mode=debug, unsafe_jump=ujump)
-        goif_code.run(*sys.argv[2 + offset:])
+        goif_code = GOIF(argv[0], **options)
+        trace_file = None
+        if trace:
+            trace_file = open(os.path.basename(argv[0]) + ".trace", 'wb')
+            goif_code.add_tracer(BinaryTraceWriter(goif_code, trace_file))
+        try:
+            goif_code.run(*argv[1:])
+        finally:
+            if trace_file is not None:
+                trace_file.close()
+            if profile:
+                goif_code.profiler.print_report(sys.stderr)
+                collapsed = os.path.basename(argv[0]) + ".collapsed"
+                with open(collapsed, 'w') as f:
+                    goif_code.profiler.write_collapsed(f)
+                print(f"\nCall stacks for flame graphs were written to {collapsed}", file=sys.stderr)
     else:
-        if len(sys.argv) < 3:
-            goif_code = GOIF(None, debug_mode=debug, unsafe_jump=ujump)
+        # Lines for STDIN and lines for the prompt come from the same place, so read them one at a time
+        options['streams'] = Streams(stdin=sys.stdin)
+        if not argv:
+            goif_code = GOIF(None, **options)
         else:
-            goif_code = GOIF(sys.argv[1 + offset], debug_mode=debug, unsafe_jump=ujump)
-        goif_code.setup(*sys.argv[2 + offset:])
+            goif_code = GOIF(argv[0], **options)
+        goif_code.setup(*argv[1:])
         cur_line = ""
         while cur_line.upper() != "RETURN":
             cur_line = input('>>> ')
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Run a GOIF program on a running daemon.py, which keeps programs compiled between runs.
+
+This only imports what it needs to talk to the daemon, so it starts much faster than goif.py."""
+
+import json
+import os
+import re
+import socket
+import struct
+import sys
+
+__author__ = "Chase Hult"
+
+# The flags that mean the same thing here as they do for goif.py
+FLAGS = {'c': 'cache', 'd': 'debug_mode', 'j': 'unsafe_jump', 'l': 'lazy', 'n': 'intrinsics', 'o': 'optimize'}
+# These turn something off
+INVERTED = {'c', 'n'}
+# The limits goif.py takes as --name=value, and what their values are
+LIMITS = {'instructions': int, 'depth': int, 'memory': int, 'seconds': float}
+
+
+def socket_path() -> str:
+    """Where the daemon listens.  Unless GOIF_SOCKET says otherwise, that's in a directory only this user can use."""
+    if os.environ.get('GOIF_SOCKET'):
+        return os.environ['GOIF_SOCKET']
+    directory = os.environ.get('XDG_RUNTIME_DIR') or f"/tmp/goif-{os.getuid()}"
+    return os.path.join(directory, "goif.sock")
+
+
+def check_peer(sock: socket.socket, path: str) -> None:
+    """Make sure the other end of a connected socket belongs to this user, since the client hands it its streams."""
+    if hasattr(socket, 'SO_PEERCRED'):
+        _, uid, _ = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+    else:  # Without peer credentials, trust whoever owns the socket
+        uid = os.stat(path).st_uid
+    if uid != os.getuid():
+        raise PermissionError(f"The socket at {path} belongs to another user.")
+
+
+def run(fp: str, args, options, path: str = None, limits=None) -> int:
+    """Run a program on the daemon with this process's STDIN, STDOUT and STDERR, giving back its exit status."""
+    # The daemon runs somewhere else, so relative paths have to start from here
+    request = json.dumps({'path': fp, 'cwd': os.getcwd(), 'args': list(args), 'options': options,
+                          'limits': limits or {}}) + "\n"
+    path = path or socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        check_peer(sock, path)
+        # The daemon reads and writes our streams directly, so nothing else has to go through the socket
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(sock, [request.encode()], [0, 1, 2])
+        response = b""
+        while chunk := sock.recv(4096):
+            response += chunk
+    # No response means the daemon died or was stopped partway through
+    return json.loads(response)['status'] if response else 1
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    options = {}
+    limits = {}
+    usage = "Usage:\n goifc.py [-cdjlno] [--limit=value ...] path/to/file.goif [arg ...]"
+    while argv and argv[0].startswith("-"):
+        arg = argv.pop(0)
+        if not arg.startswith("--"):
+            for flag in arg[1:]:
+                if flag in FLAGS:
+                    options[FLAGS[flag]] = flag not in INVERTED
+            continue
+        name, _, value = arg[2:].partition("=")
+        if name not in LIMITS or not re.fullmatch(r'\d+(\.\d*)?' if LIMITS[name] is float else r'\d+', value):
+            print(usage)
+            exit(1)
+        limits[name] = LIMITS[name](value)
+
+    if not argv:
+        print(usage)
+        exit(1)
+
+    try:
+        exit(run(argv[0], argv[1:], options, limits=limits))
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"The GOIF daemon isn't running at {socket_path()}.  Start it with daemon.py.", file=sys.stderr)
+        exit(1)
+    except PermissionError as e:
+        print(f"Refusing to run on the GOIF daemon: {e}", file=sys.stderr)
+        exit(1)
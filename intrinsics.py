@@ -0,0 +1,52 @@
+import math
+import re
+from typing import Any, Callable, NamedTuple, Optional
+
+from ropes import STRINGS
+
+__author__ = "Chase Hult"
+
+
+class Intrinsic(NamedTuple):
+    """A native version of a standard library routine.
+
+    `fn` takes ARG1 and gives back RET1, or None when the routine would throw or error.  Those cases always run
+    the GOIF code instead so that the messages, line numbers and handlers are exactly the same."""
+    fn: Callable[[Any], Optional[Any]]
+    depth: int  # The most frames the GOIF routine pushes, so call stack overflows still happen
+
+
+def _length(arg):
+    if isinstance(arg, STRINGS):
+        return len(arg)
+
+
+def _to_num(arg):
+    # Only ASCII digits pass the GOIF version, so \d isn't good enough here
+    if isinstance(arg, STRINGS) and re.fullmatch(r'-?[0-9]+', arg := str(arg)):
+        try:
+            return int(arg)
+        except ValueError:  # Python refuses to convert very long numbers
+            return None
+
+
+def _to_string(arg):
+    if type(arg) is int:
+        try:
+            return str(arg)
+        except ValueError:
+            return None
+
+
+def _sqrt(arg):
+    if type(arg) is int and arg >= 0:
+        return math.isqrt(arg)
+
+
+# Standard library labels to their intrinsics
+INTRINSICS = {
+    'LENGTH': Intrinsic(_length, 2),
+    'TO_NUM': Intrinsic(_to_num, 3),
+    'TO_STRING': Intrinsic(_to_string, 1),
+    'SQRT': Intrinsic(_sqrt, 1),
+}
@@ -0,0 +1,84 @@
+import sys
+from typing import Any, List, NamedTuple, Optional
+
+from ropes import Rope
+
+__author__ = "Chase Hult"
+
+# How many instructions run between checks of the time and memory limits
+CHECK_EVERY = 1024
+
+# What the interpreter's own objects cost, so an estimate doesn't depend on the Python version
+SLOT_SIZE = sys.getsizeof([None]) - sys.getsizeof([])
+EMPTY_STR_SIZE = sys.getsizeof("")
+
+
+class Limits(NamedTuple):
+    """How much a single run of a program can use.  None means no limit.
+
+    `memory` is an estimate of the bytes held by variables in every frame, and `seconds` is wall clock time.
+    Without a `depth`, JUMPs can go 255 frames deep unless unsafe_jump is on."""
+    instructions: Optional[int] = None
+    depth: Optional[int] = None
+    memory: Optional[int] = None
+    seconds: Optional[float] = None
+
+
+class Usage(NamedTuple):
+    """How much a run had used when it went over a limit."""
+    instructions: int
+    depth: int
+    memory: int
+    seconds: float
+
+    def __str__(self) -> str:
+        return f"{self.instructions} instructions, a depth of {self.depth}, {self.memory} bytes of variables" \
+               f" and {self.seconds:.2f} seconds"
+
+
+def frame_memory(frame_vars: List[Any]) -> int:
+    """Estimate the bytes used by the variables in a frame.
+
+    Booleans and UNSET are shared, so they only cost their slot.  A rope counts its length, since the buffer
+    it's part of may be shared with others."""
+    memory = SLOT_SIZE * len(frame_vars)
+    for value in frame_vars:
+        cls = value.__class__
+        if cls is str or cls is int:
+            memory += sys.getsizeof(value)
+        elif cls is Rope:
+            memory += EMPTY_STR_SIZE + len(value)
+    return memory
+
+
+class MemoryMeter:
+    """Estimates the memory used by variables, remembering what each frame on the call stack used.
+
+    A frame's variables can't change while it's on the call stack, and a frame that's popped and pushed again
+    is a new Frame, so only the frames pushed since the last measurement have to be measured."""
+
+    def __init__(self):
+        self.frames: List[Any] = []
+        self.totals: List[int] = [0]  # The memory used by self.frames[:i]
+
+    def measure(self, call_stack: List[Any], cur_vars: List[Any]) -> int:
+        # Frames only come and go at the top of the stack, so everything under one that's still there is too
+        keep = min(len(self.frames), len(call_stack))
+        while keep and self.frames[keep - 1] is not call_stack[keep - 1]:
+            keep -= 1
+        del self.frames[keep:], self.totals[keep + 1:]
+        for frame in call_stack[keep:]:
+            self.frames.append(frame)
+            self.totals.append(self.totals[-1] + frame_memory(frame.vars))
+        return self.totals[-1] + frame_memory(cur_vars)
+
+
+def memory_check_interval(memory: int, limit: int) -> int:
+    """How many instructions can run before variables using `memory` bytes could go over `limit`.
+
+    A line like S ^ S INTO T or X * X INTO Y doubles a value and keeps the original, so memory can about triple
+    each instruction.  Far from the limit memory is rarely measured, and close to it it's measured every time."""
+    interval = 1
+    while memory * 3 ** interval <= limit and interval < CHECK_EVERY:
+        interval += 1
+    return interval
@@ -2,7 +2,10 @@ __author__ = "Kendyl Reisinger"
 
 # This function will take in an operator and one or two operands in the form of ('<operator>', <operand1>, <operand2>).
 # The function of the operator will then be performed and the result returned.
+import operator
+
 from exceptions import GOIFException, GOIFRuntimeError
+from ropes import STRINGS, concat
 
 
 def operate(optr, *args):
@@ -123,3 +126,188 @@ def operate(optr, *args):
                 return args[2]
         else:
             raise GOIFRuntimeError("First operand must be bool.")
+
+
+# Operators can also be resolved ahead of time.  specialize takes an operator and its compiled operands
+# (functions of the interpreter) along with each operand's static type (or None if it isn't known until
+# runtime) and gives back one function that does the operation.  Type checks are left out wherever the
+# static types already guarantee them.  The results and errors are the same as operate, except that long strings
+# built with ^ are ropes, which work like strings everywhere.
+def _is_int(typ):
+    # bool is a subclass of int, so a bool passes every integer check
+    return typ is int or typ is bool
+
+
+def _int_op(fn, msg):
+    def build(a1, a2, t1, t2):
+        if _is_int(t1) and _is_int(t2):
+            return lambda g: fn(a1(g), a2(g))
+
+        def checked(g):
+            x, y = a1(g), a2(g)
+            if isinstance(x, int) and isinstance(y, int):
+                return fn(x, y)
+            raise GOIFRuntimeError(msg)
+
+        return checked
+
+    return build
+
+
+def _div_op(fn):
+    def build(a1, a2, t1, t2):
+        typed = _is_int(t1) and _is_int(t2)
+
+        def divide(g):
+            x, y = a1(g), a2(g)
+            if not typed and not (isinstance(x, int) and isinstance(y, int)):
+                raise GOIFRuntimeError("Operand must both be integers.")
+            if y == 0:
+                raise GOIFException("OP_FAIL")
+            return fn(x, y)
+
+        return divide
+
+    return build
+
+
+def _eq_op(fn):
+    def build(a1, a2, t1, t2):
+        if (_is_int(t1) and _is_int(t2)) or (t1 is str and t2 is str):
+            return lambda g: fn(a1(g), a2(g))
+
+        def checked(g):
+            x, y = a1(g), a2(g)
+            if (isinstance(x, int) and isinstance(y, int)) or (isinstance(x, STRINGS) and isinstance(y, STRINGS)):
+                return fn(x, y)
+            raise GOIFRuntimeError("Operands must both be integers or must both be strings.")
+
+        return checked
+
+    return build
+
+
+def _bool_op(fn):
+    def build(a1, a2, t1, t2):
+        if t1 is bool and t2 is bool:
+            return lambda g: fn(a1(g), a2(g))
+
+        def checked(g):
+            x, y = a1(g), a2(g)
+            if isinstance(x, bool) and isinstance(y, bool):
+                return fn(x, y)
+            raise GOIFRuntimeError("Operands must both be booleans.")
+
+        return checked
+
+    return build
+
+
+def _index(a1, a2, t1, t2):
+    typed = t1 is str and _is_int(t2)
+
+    def index(g):
+        x, y = a1(g), a2(g)
+        if not typed and not (isinstance(x, STRINGS) and isinstance(y, int)):
+            raise GOIFRuntimeError("First operand must be a string and second operand must be an integer.")
+        if y > len(x):
+            raise GOIFException("OP_FAIL")
+        return x[y - 1]
+
+    return index
+
+
+def _concat(a1, a2, t1, t2):
+    typed = t1 is str and t2 is str
+
+    def concatenate(g):
+        x, y = a1(g), a2(g)
+        if not typed and not (isinstance(x, STRINGS) and isinstance(y, STRINGS)):
+            raise GOIFRuntimeError("Operands must both be strings.")
+        return concat(x, y)
+
+    return concatenate
+
+
+def _negate(a1, t1):
+    if _is_int(t1):
+        return lambda g: -a1(g)
+
+    def checked(g):
+        x = a1(g)
+        if isinstance(x, int):
+            return -x
+        # operate gives back nothing for a non-integer
+        return None
+
+    return checked
+
+
+def _not(a1, t1):
+    if t1 is bool:
+        return lambda g: not a1(g)
+
+    def checked(g):
+        x = a1(g)
+        if isinstance(x, bool):
+            return not x
+        raise GOIFRuntimeError("Operand must be a boolean.")
+
+    return checked
+
+
+def _ternary(a1, a2, a3, t1, t2, t3):
+    # Both branches are evaluated, just like operate
+    if t1 is bool:
+        def ternary(g):
+            x, y, z = a1(g), a2(g), a3(g)
+            return y if x else z
+        return ternary
+
+    def checked(g):
+        x, y, z = a1(g), a2(g), a3(g)
+        if isinstance(x, bool):
+            return y if x else z
+        raise GOIFRuntimeError("First operand must be bool.")
+
+    return checked
+
+
+_DYADIC = {
+    '+': _int_op(operator.add, "Operands must both be integers."),
+    '-': _int_op(operator.sub, "Operands must be integers."),
+    '*': _int_op(operator.mul, "Operands must both be integers."),
+    '<': _int_op(operator.lt, "Operands must both be integers."),
+    '>': _int_op(operator.gt, "Operands must both be integers."),
+    '<=': _int_op(operator.le, "Operands must both be integers."),
+    '>=': _int_op(operator.ge, "Operands must both be integers."),
+    '==': _eq_op(operator.eq),
+    '!=': _eq_op(operator.ne),
+    '/': _div_op(operator.floordiv),
+    '\\': _div_op(operator.mod),
+    '&': _bool_op(operator.and_),
+    '|': _bool_op(operator.or_),
+    '#': _index,
+    '^': _concat,
+}
+
+_MONADIC = {
+    '-': _negate,
+    '!': _not,
+}
+
+# The type every operator is guaranteed to give back, if it gives back anything
+RESULT_TYPES = {
+    '+': int, '-': int, '*': int, '/': int, '\\': int,
+    '<': bool, '>': bool, '<=': bool, '>=': bool, '==': bool, '!=': bool,
+    '!': bool, '&': bool, '|': bool,
+    '#': str, '^': str,
+}
+
+
+def specialize(optr, args, types):
+    if len(args) == 1:
+        return _MONADIC[optr](*args, *types)
+    if len(args) == 2:
+        return _DYADIC[optr](*args, *types)
+    return _ternary(*args, *types)
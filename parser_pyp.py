@@ -1,11 +1,8 @@
-from enum import Enum, auto
-
-from pyparsing import Char, Combine, Empty, Group, Keyword as _Keyword, LineEnd, Literal, OpAssoc, Opt, ParseResults, \
+from pyparsing import And, Char, Combine, Empty, Group, Keyword as _Keyword, LineEnd, Literal, OpAssoc, Opt, \
     ParserElement, Regex, SkipTo, StringEnd, Suppress, White, Word, alphanums, alphas, common, delimited_list, \
-    infix_notation, \
-    nums, one_of
+    infix_notation, lineno, nums, one_of
 
-from operator_exprs import operate
+from statements import Const, Go, GoIf, Into, Jump, LineId, Op, Return, SpecialValues, Str, Throw, Unset, Var
 
 __author__ = "Chase Hult"
 
@@ -28,41 +25,40 @@ def not_keyword(tokens):
     return var.strip() not in KEYWORDS
 
 
-class SpecialValues(Enum):
-    Empty = auto()
-
-
 cfg_ws = Suppress(White())
 
 cfg_var = common.identifier
 cfg_var.add_condition(not_keyword)
-cfg_expr_var = cfg_var.copy()
+cfg_expr_var = cfg_var.copy().add_parse_action(lambda pr: Var(pr[0]))
 cfg_unset_var = Combine(Suppress('@') + Char(alphas + '_') + Char(alphanums + '_')[...])
+cfg_unset_var.add_parse_action(lambda pr: Unset(pr[0]))
 
 cfg_empty = Literal("@").add_parse_action(lambda pr: SpecialValues.Empty)
-cfg_int = common.signed_integer
+cfg_int = common.signed_integer.copy().add_parse_action(lambda pr: Const(pr[0]))
 cfg_str = Combine('"' + Word(nums) + '"')
-# This is true because of special string handling.  We need to add our parse action later.
+# This is true because of special string handling.  The compiler fills in the preserved value.
+cfg_str.add_parse_action(lambda pr: Str(int(pr[0][1:-1])))
 cfg_bool = Literal("TRUE") | Literal("FALSE")
-cfg_bool.add_parse_action(lambda pr: pr[0] == 'TRUE')
+cfg_bool.add_parse_action(lambda pr: Const(pr[0] == 'TRUE'))
 
 
 def fold_expr(num=2):
+    """Fold a level of the operator table into an expression tree."""
     def _fold(expr):
         if len(expr) == 1:
             return expr[0]
         elif num == 1:
             op, a1 = expr
-            return operate(op, a1)
+            return Op(op, (a1,))
         elif num == 2:
             # Dyadic operators with equal presidence chain in PyParsing
             #  so we need to do this recursively.
             # ex. 1+2+3 -> [1, +, 2, +, 3] rather than [[1, +, 2], +, 3]
             a1, op, *a2 = expr
-            return operate(op, a1, _fold(a2))
+            return Op(op, (a1, _fold(a2)))
         elif num == 3:
             a1, op, a2, _, a3 = expr
-            return operate(op, a1, a2, a3)
+            return Op(op, (a1, a2, a3))
 
     return lambda m: [_fold(m[0])]
 
@@ -102,14 +98,30 @@ cfg_label_stmt = Combine(cfg_lbl_ln + ':')
 cfg_load_file_id = cfg_file_id.copy().add_condition(lambda pr: pr[0].upper() != "MAIN")
 cfg_load_stmt = Keyword("LOAD") + cfg_goif_file + cfg_ws + cfg_load_file_id
 cfg_go_stmt = Keyword("GO") + cfg_line_id
+cfg_go_stmt.add_parse_action(lambda pr: Go(LineId(*pr[0])))
 cfg_goif_stmt = Keyword("GOIF") + cfg_line_id + cfg_ws + cfg_expr
+cfg_goif_stmt.add_parse_action(lambda pr: GoIf(LineId(*pr[0]), pr[1]))
 cfg_jump_stmt = Keyword("JUMP") + cfg_line_id + cfg_exprs + Group(cfg_handle_sbstmt)[...]
+cfg_jump_stmt.add_parse_action(
+    lambda pr: Jump(LineId(*pr[0]), tuple(pr[1]), tuple((exc, LineId(*lid)) for exc, lid in pr[2:])))
 cfg_throw_stmt = Keyword("THROW") + cfg_exception
+cfg_throw_stmt.add_parse_action(lambda pr: Throw(pr[0]))
 cfg_ret_stmt = Keyword("RETURN") + cfg_exprs
+cfg_ret_stmt.add_parse_action(lambda pr: Return(tuple(pr[0])))
 cfg_into_stmt = (cfg_expr | cfg_empty) + cfg_ws + Keyword("INTO") + cfg_var
+cfg_into_stmt.add_parse_action(lambda pr: Into(pr[0], pr[1]))
+
+# Compilation (Builds statement nodes)
+cfg_stmt = cfg_go_stmt | cfg_goif_stmt | cfg_jump_stmt | cfg_throw_stmt | cfg_ret_stmt | cfg_into_stmt
 
 cfg_comment = Suppress(Literal("%") + Regex('[^\n]*'))
 
+# Builds the statement nodes of a whole file at once, each after the number of the line it starts on.  LOAD lines
+#  have to be removed first.
+cfg_located_stmt = And([cfg_stmt]).add_parse_action(lambda s, loc, pr: [lineno(loc, s), pr[0]])
+cfg_module_line = Opt(cfg_located_stmt | Suppress(cfg_label_stmt)) + Opt(cfg_comment)
+cfg_module = delimited_list(cfg_module_line, delim=LineEnd()) + StringEnd()
+
 # Evaluation (Inert)
 cfg_var_eval = Combine(Char(alphas + '_') + Char(alphanums + '_')[...])
 cfg_var_eval.add_condition(not_keyword)
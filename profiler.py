@@ -0,0 +1,133 @@
+import time
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from typing import Dict, List, TextIO, Tuple
+
+__author__ = "Chase Hult"
+
+
+class Profiler:
+    """Time every instruction a GOIF program runs.
+
+    This works by wrapping the interpreter's dispatch table, so a program that isn't being profiled pays nothing.
+    Time is kept per line, per routine (the code between one label and the next), and per call stack.  A call
+    stack is the routines JUMPed into to get where we are."""
+
+    def __init__(self, goif):
+        self.goif = goif
+        self.line_times: Dict[Tuple[int, int], List] = {}  # (file id, instruction index) to [count, seconds]
+        self.stack_times: Dict[Tuple[str, ...], float] = defaultdict(float)  # Time spent with this exact stack
+        self.calls: Counter = Counter()  # (caller, callee) to how many times the JUMP happened
+        self.stack: Tuple[str, ...] = ()
+        self.routines: Dict[Tuple[int, int], str] = {}
+
+        for cls, fn in goif.dispatch.items():
+            goif.dispatch[cls] = self.timed(fn)
+
+    def timed(self, fn):
+        goif = self.goif
+        clock = time.perf_counter
+
+        def timed_fn(stmt):
+            fid, pc = goif.cur_file, goif.pc
+            self.sync_stack(fid, pc)
+            start = clock()
+            try:
+                fn(stmt)
+            finally:
+                self.record(fid, pc, clock() - start)
+
+        return timed_fn
+
+    def sync_stack(self, fid: int, pc: int) -> None:
+        """Catch up with any frames pushed or popped by the last instruction."""
+        depth = len(self.goif.call_stack) + 1
+        if depth > len(self.stack):
+            # A JUMP only pushes one frame, and it starts where we are now
+            callee = self.routine(fid, pc)
+            if self.stack:
+                self.calls[self.stack[-1], callee] += 1
+            self.stack += (callee,)
+        elif depth < len(self.stack):
+            self.stack = self.stack[:depth]
+
+    def record(self, fid: int, pc: int, seconds: float) -> None:
+        times = self.line_times.get((fid, pc))
+        if times is None:
+            times = self.line_times[fid, pc] = [0, 0.0]
+        times[0] += 1
+        times[1] += seconds
+        self.stack_times[self.stack] += seconds
+
+    def routine(self, fid: int, pc: int) -> str:
+        """Name the routine an instruction is in after the closest label above it."""
+        if (fid, pc) not in self.routines:
+            ln = self.goif.line_nos[fid][pc]
+            labels = sorted((line, label) for label, line in self.goif.labels[fid].items())
+            # MAIN is on line 1 unless it's labeled, which can be the same line as an instruction
+            idx = bisect_right([line for line, _ in labels], ln) - 1
+            name = "INPUT" if ln == float('inf') else labels[idx][1] if idx >= 0 else "(top)"
+            self.routines[fid, pc] = f"{self.goif.fid_to_str[fid]}:{name}"
+        return self.routines[fid, pc]
+
+    def inclusive_times(self) -> Tuple[Dict[str, float], Dict[Tuple[str, str], float]]:
+        """Give the time spent in each routine and along each JUMP, including everything called from it.
+
+        Recursion is only counted once per call stack."""
+        routines = defaultdict(float)
+        edges = defaultdict(float)
+        for stack, seconds in self.stack_times.items():
+            for routine in set(stack):
+                routines[routine] += seconds
+            for edge in set(zip(stack, stack[1:])):
+                edges[edge] += seconds
+        return routines, edges
+
+    def print_report(self, file: TextIO, limit: int = 25) -> None:
+        total = sum(self.stack_times.values()) or 1e-9
+
+        print(f"\nProfile: {sum(count for count, _ in self.line_times.values())} instructions"
+              f" in {total * 1000:.3f} ms", file=file)
+
+        print("\nLines by time:", file=file)
+        print(f"{'ms':>10} {'%':>6} {'count':>10} {'us each':>9}  line", file=file)
+        by_time = sorted(self.line_times.items(), key=lambda item: -item[1][1])
+        for (fid, pc), (count, seconds) in by_time[:limit]:
+            ln = self.goif.line_nos[fid][pc]
+            line = self.goif.restore_string(self.goif.lines[fid][pc], fid, keep_quotes=True) or "(end of file)"
+            where = f"{self.goif.fid_to_str[fid]}:{ln if ln != float('inf') else 'N/A'}"
+            print(f"{seconds * 1000:10.3f} {seconds / total:6.1%} {count:10} {seconds / count * 1e6:9.2f}"
+                  f"  {where}  {line}", file=file)
+
+        routine_times = defaultdict(lambda: [0, 0.0])
+        for (fid, pc), (count, seconds) in self.line_times.items():
+            times = routine_times[self.routine(fid, pc)]
+            times[0] += count
+            times[1] += seconds
+        print("\nRoutines by time:", file=file)
+        print(f"{'ms':>10} {'%':>6} {'count':>10}  routine", file=file)
+        for routine, (count, seconds) in sorted(routine_times.items(), key=lambda item: -item[1][1])[:limit]:
+            print(f"{seconds * 1000:10.3f} {seconds / total:6.1%} {count:10}  {routine}", file=file)
+
+        inclusive, edges = self.inclusive_times()
+        exclusive = defaultdict(float)
+        for stack, seconds in self.stack_times.items():
+            exclusive[stack[-1]] += seconds
+        calls = Counter()
+        for (_, callee), count in self.calls.items():
+            calls[callee] += count
+        print("\nCall graph by inclusive time:", file=file)
+        print(f"{'incl ms':>10} {'excl ms':>10} {'calls':>8}  routine", file=file)
+        for routine, seconds in sorted(inclusive.items(), key=lambda item: -item[1])[:limit]:
+            print(f"{seconds * 1000:10.3f} {exclusive[routine] * 1000:10.3f} {calls[routine]:8}  {routine}",
+                  file=file)
+            for (caller, callee), edge_seconds in sorted(edges.items(), key=lambda item: -item[1]):
+                if caller == routine:
+                    print(f"{edge_seconds * 1000:10.3f} {'':10} {self.calls[caller, callee]:8}    -> {callee}",
+                          file=file)
+
+    def write_collapsed(self, file: TextIO) -> None:
+        """Write the time spent in each call stack in microseconds, in the format flame graph tools read."""
+        for stack, seconds in sorted(self.stack_times.items()):
+            if stack:
+                print(f"{';'.join(stack)} {round(seconds * 1e6)}", file=file)
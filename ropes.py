@@ -0,0 +1,117 @@
+from typing import List, Union
+
+__author__ = "Chase Hult"
+
+# Strings shorter than this are concatenated normally, since copying them is cheaper than keeping a rope
+MIN_LENGTH = 512
+
+
+class _Buffer:
+    """Characters that can be added to at either end.
+
+    Positions are counted from where the buffer started, so characters added to the front have negative
+    positions.  `back` holds the chunks at position 0 and after in order, and `front` holds the ones before
+    position 0, closest first."""
+    __slots__ = ('front', 'back', 'front_len', 'back_len', 'flat', 'flat_lo')
+
+    def __init__(self, chunk: str):
+        self.front: List[str] = []
+        self.back: List[str] = [chunk]
+        self.front_len = 0
+        self.back_len = len(chunk)
+        self.flat = chunk  # Everything in the buffer as of the last flatten, starting at position flat_lo
+        self.flat_lo = 0
+
+    def flatten(self) -> None:
+        front = "".join(reversed(self.front))
+        back = "".join(self.back)
+        # Joined chunks take up the same positions, so every rope on this buffer stays the same
+        self.front = [front] if front else []
+        self.back = [back]
+        self.flat = front + back
+        self.flat_lo = -self.front_len
+
+
+class Rope:
+    """A long GOIF string built with ^.
+
+    Concatenating onto either end of a rope adds to its buffer instead of copying it, as long as nothing has been
+    added to that end of the buffer yet.  Values never change, since each rope only covers positions `lo` to `hi`
+    of its buffer.  A rope is turned into a str with str(), which is cached until the buffer grows."""
+    __slots__ = ('buf', 'lo', 'hi')
+
+    def __init__(self, buf: _Buffer, lo: int, hi: int):
+        self.buf = buf
+        self.lo = lo
+        self.hi = hi
+
+    def __str__(self) -> str:
+        buf = self.buf
+        if self.lo < buf.flat_lo or self.hi > buf.flat_lo + len(buf.flat):
+            buf.flatten()
+        if self.lo == buf.flat_lo and self.hi - self.lo == len(buf.flat):
+            return buf.flat
+        return buf.flat[self.lo - buf.flat_lo:self.hi - buf.flat_lo]
+
+    def __len__(self) -> int:
+        return self.hi - self.lo
+
+    def __getitem__(self, index: int) -> str:
+        # Negative indices work like they do for str
+        if index < 0:
+            index += self.hi - self.lo
+        if not 0 <= index < self.hi - self.lo:
+            raise IndexError("string index out of range")
+        buf = self.buf
+        pos = self.lo + index - buf.flat_lo
+        if not 0 <= pos < len(buf.flat):
+            buf.flatten()
+            pos = self.lo + index - buf.flat_lo
+        return buf.flat[pos]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (str, Rope)):
+            return len(self) == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other) -> bool:
+        if isinstance(other, (str, Rope)):
+            return len(self) != len(other) or str(self) != str(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+
+String = Union[str, Rope]
+STRINGS = (str, Rope)
+
+
+def concat(x: String, y: String) -> String:
+    """Concatenate two GOIF strings."""
+    if len(x) + len(y) < MIN_LENGTH:
+        # Ropes are never this short, so these are both str
+        return x + y
+    if x.__class__ is Rope and x.hi == x.buf.back_len:
+        buf = x.buf
+        buf.back.append(str(y))
+        buf.back_len += len(y)
+        return Rope(buf, x.lo, buf.back_len)
+    if y.__class__ is Rope and y.lo == -y.buf.front_len:
+        buf = y.buf
+        buf.front.append(str(x))
+        buf.front_len += len(x)
+        return Rope(buf, -buf.front_len, y.hi)
+    # Neither end is free, so start a new buffer
+    buf = _Buffer(str(x))
+    buf.back.append(str(y))
+    buf.back_len += len(y)
+    return Rope(buf, 0, buf.back_len)
+
+
+def flat(value):
+    """Turn a rope into a str, leaving any other value alone."""
+    return str(value) if value.__class__ is Rope else value
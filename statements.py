@@ -0,0 +1,135 @@
+from enum import Enum, auto
+from typing import Any, NamedTuple, Optional, Tuple, Union
+
+__author__ = "Chase Hult"
+
+
+class SpecialValues(Enum):
+    Empty = auto()
+
+
+class LineId(NamedTuple):
+    file: Optional[str]
+    line: str
+
+
+# Expressions
+class Const(NamedTuple):
+    value: Union[bool, int, str]
+
+
+class Str(NamedTuple):
+    idx: int  # Identifier of a preserved string
+
+
+class Var(NamedTuple):
+    name: str
+
+
+class Unset(NamedTuple):
+    name: str
+
+
+class Op(NamedTuple):
+    op: str
+    args: Tuple[Any, ...]
+
+
+Expr = Union[Const, Str, Var, Unset, Op]
+
+
+# Statements
+class Go(NamedTuple):
+    target: LineId
+
+
+class GoIf(NamedTuple):
+    target: LineId
+    cond: Expr
+
+
+class Jump(NamedTuple):
+    target: LineId
+    args: Tuple[Expr, ...]
+    handlers: Tuple[Tuple[str, LineId], ...]
+
+
+class Throw(NamedTuple):
+    exception: str
+
+
+class Return(NamedTuple):
+    rets: Tuple[Expr, ...]
+
+
+class Into(NamedTuple):
+    expr: Any  # An Expr or SpecialValues.Empty
+    var: Union[str, int]  # A variable name, or its slot once compiled
+
+
+class Write(NamedTuple):
+    """An INTO one of the standard streams."""
+    expr: Expr
+    stream: str
+
+
+class Native(NamedTuple):
+    """A JUMP into a standard library routine that can run natively."""
+    target: LineId
+    args: Tuple[Expr, ...]
+    handlers: Tuple[Tuple[str, LineId], ...]
+    intrinsic: Any
+
+
+class TailJump(NamedTuple):
+    """A JUMP with no HANDLEs followed by a bare RETURN, which can reuse the caller's frame."""
+    target: LineId
+    args: Tuple[Expr, ...]
+
+
+# Superinstructions run an instruction and the one it goes to next in one step.  They keep the field names of the
+# first instruction, so they can also run as just that one.  The second instruction is still in its own place too.
+class IntoInto(NamedTuple):
+    expr: Any
+    var: int
+    expr2: Any
+    var2: int
+
+
+class IntoGoIf(NamedTuple):
+    expr: Any
+    var: int
+    target: LineId
+    cond: Expr
+
+
+class IntoGo(NamedTuple):
+    expr: Any
+    var: int
+    target: LineId
+
+
+class GoIfInto(NamedTuple):
+    target: LineId
+    cond: Expr
+    expr: Any
+    var: int
+
+
+class GoGoIf(NamedTuple):
+    """A GO to a GOIF, like at the bottom of a loop."""
+    target: LineId
+    target2: LineId
+    cond: Expr
+
+
+class Pending(NamedTuple):
+    """An instruction in a file that hasn't been compiled yet."""
+
+
+class End(NamedTuple):
+    """Marks the end of a file's instructions."""
+
+
+Stmt = Union[Go, GoIf, Jump, Throw, Return, Into, Write, Native, TailJump, IntoInto, IntoGoIf, IntoGo, GoIfInto,
+             GoGoIf, Pending, End]
@@ -0,0 +1,115 @@
+import io
+import mmap
+import sys
+from typing import BinaryIO, Callable, List, Optional, TextIO, Union
+
+from exceptions import GOIFException
+
+__author__ = "Chase Hult"
+
+
+class LineReader:
+    """Read lines from a binary source a large chunk at a time, instead of one line at a time like input().
+
+    `read1` is used when the source has it, so a pipe that's still being written to gives back what's there
+    instead of waiting for a whole chunk."""
+
+    def __init__(self, source: Union[BinaryIO, mmap.mmap], encoding: str = 'utf-8', errors: str = 'strict',
+                 chunk_size: int = 1 << 16):
+        self.read = getattr(source, 'read1', source.read)
+        self.encoding = encoding
+        self.errors = errors
+        self.chunk_size = chunk_size
+        self.lines: List[bytes] = []  # Whole lines that haven't been read yet, last first
+        self.partial = b""  # The start of a line whose end hasn't been read yet
+
+    def readline(self) -> Optional[str]:
+        """Read a line without its line ending, or None at the end of the input."""
+        while not self.lines:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                if not self.partial:
+                    return None
+                line, self.partial = self.partial, b""
+                return line.decode(self.encoding, self.errors)
+            lines = (self.partial + chunk).split(b"\n")
+            self.partial = lines.pop()
+            lines.reverse()
+            self.lines = lines
+        line = self.lines.pop()
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        return line.decode(self.encoding, self.errors)
+
+
+class Streams:
+    """STDIN, STDOUT and STDERR for a GOIF program.
+
+    Output is buffered and written when the buffer fills, before STDIN is read, when writing switches between
+    STDOUT and STDERR, and when the program stops.  STDIN is read in bulk unless it's a terminal.
+
+    Any stream left as None is looked up in `sys` when it's used, so redirecting `sys.stdout` and the like still
+    works.  A text stream given as `stdin` is read a line at a time, and a binary one in bulk.  It can also be a
+    path, which is memory mapped."""
+
+    def __init__(self, stdin: Union[None, str, TextIO, BinaryIO] = None, stdout: Optional[TextIO] = None,
+                 stderr: Optional[TextIO] = None, *, buffer_size: int = 1 << 13):
+        if isinstance(stdin, str):
+            with open(stdin, 'rb') as f:
+                # Empty files can't be mapped
+                stdin = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else io.BytesIO()
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.buffer_size = buffer_size
+
+        self.pending: List[str] = []
+        self.pending_size = 0
+        self.pending_stream = "STDOUT"  # Which stream the pending output is for
+
+        self.reader = None
+        self.reader_source = None  # What the reader was made for
+
+    def write(self, stream: str, text: str) -> None:
+        if stream != self.pending_stream:
+            self.flush()
+            self.pending_stream = stream
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            file = (self.stdout or sys.stdout) if self.pending_stream == "STDOUT" else (self.stderr or sys.stderr)
+            file.write("".join(self.pending))
+            file.flush()
+            self.pending = []
+            self.pending_size = 0
+
+    def read_line(self) -> str:
+        """Read a line from STDIN, throwing EOF if there's nothing left."""
+        self.flush()
+        source = sys.stdin if self.stdin is None else self.stdin
+        if source is not self.reader_source:
+            self.reader = self.make_reader(source, self.stdin is None)
+            self.reader_source = source
+        line = self.reader()
+        if line is None:
+            raise GOIFException("EOF")
+        return line
+
+    @staticmethod
+    def make_reader(source, is_sys: bool) -> Callable[[], Optional[str]]:
+        """Make something that reads a line from `source` without its line ending, or None at the end."""
+        if isinstance(source, io.TextIOBase):
+            if is_sys and hasattr(source, 'buffer') and not source.isatty():
+                return LineReader(source.buffer, source.encoding, source.errors).readline
+
+            # Lines typed into a terminal have to be read one at a time
+            def readline():
+                line = source.readline()
+                return line[:-1] if line.endswith("\n") else line or None
+
+            return readline
+        return LineReader(source).readline
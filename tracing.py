@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+import struct
+import sys
+from typing import Any, BinaryIO, Dict, Iterator, TextIO, Tuple
+
+from compiler import UNSET
+from statements import End, Stmt
+
+__author__ = "Chase Hult"
+
+
+class Tracer:
+    """Receives events from a running GOIF program.  Subclasses override the events they care about.
+
+    Add one with GOIF.add_tracer.  Lines are given as a file id and an instruction index, which the GOIF's
+    line_nos and lines turn into a line number and its text."""
+
+    def line(self, fid: int, pc: int, stmt: Stmt) -> None:
+        """An instruction is about to run."""
+
+    def store(self, var: str, value: Any) -> None:
+        """A variable or stream is about to be set.  `value` is UNSET when a variable is being unset."""
+
+    def push(self, fid: int, pc: int) -> None:
+        """The JUMP at instruction `pc` of file `fid` pushed a frame."""
+
+    def pop(self, fid: int, pc: int) -> None:
+        """A frame was popped, returning to instruction `pc` of file `fid`."""
+
+    def throw(self, exc: str, explicit: bool) -> None:
+        """An exception was thrown, either by a THROW or by an expression failing."""
+
+    def handle(self, exc: str, fid: int, pc: int) -> None:
+        """An exception was handled, going to instruction `pc` of file `fid`.
+
+        The frames it unwound aren't popped, so they have no pop events."""
+
+
+class DebugTracer(Tracer):
+    """Print each line and what it does.  This is debug mode (-d).
+
+    Without a `file`, this prints to wherever the program's STDOUT goes."""
+
+    def __init__(self, goif, file: TextIO = None):
+        self.goif = goif
+        self.file = file
+        self.formatted: Dict[Tuple[int, int], str] = {}
+
+    def out(self) -> TextIO:
+        return self.file or self.goif.streams.stdout or sys.stdout
+
+    def line(self, fid, pc, stmt):
+        if stmt.__class__ is End:
+            return
+        self.goif.streams.flush()  # Keep the program's output in order with ours
+        formatted = self.formatted.get((fid, pc))
+        if formatted is None:
+            ln = self.goif.line_nos[fid][pc]
+            line = self.goif.restore_string(self.goif.lines[fid][pc], fid, keep_quotes=True)
+            formatted = f" #{fid}{'-' + str(ln) if ln != float('inf') else ''}: {line}"
+            if ln != float('inf'):  # Lines typed into interactive mode all run from the same place
+                self.formatted[fid, pc] = formatted
+        print(f"[{len(self.goif.call_stack) + 1}]{formatted}", file=self.out())
+
+    def store(self, var, value):
+        self.goif.streams.flush()
+        print(f"Unsetting {var}." if value is UNSET else f"Storing {repr(value)} into {var}.",
+              file=self.out())
+
+    def throw(self, exc, explicit):
+        if not explicit:
+            self.goif.streams.flush()
+            print(f"Failed expression.  Throwing {exc}", file=self.out())
+
+
+# Binary traces are a header followed by records, each starting with one of these bytes.  Strings (file names,
+# variable names and exception names) are defined once with a STRING record and referred to by id after that.
+MAGIC = b"GOIFTRC1"
+STRING, LINE, STORE, PUSH, POP, THROW, HANDLE = range(7)
+# Values in STORE records start with one of these bytes
+V_UNSET, V_FALSE, V_TRUE, V_INT, V_BIGINT, V_STR = range(6)
+
+_HEADER = struct.Struct('<BI')  # Record type and a string id or length
+_LOCATION = struct.Struct('<IIB')  # A file's string id, a line number (0 if it has none), and a flag
+_INT = struct.Struct('<q')
+_LENGTH = struct.Struct('<I')
+
+
+class BinaryTraceWriter(Tracer):
+    """Write a compact trace of every event for looking at later with read_trace.
+
+    Lines are recorded by file name and line number so the trace makes sense without the program."""
+
+    def __init__(self, goif, file: BinaryIO):
+        self.goif = goif
+        self.file = file
+        self.strings: Dict[str, int] = {}
+        file.write(MAGIC)
+
+    def string(self, string: str) -> int:
+        if string not in self.strings:
+            data = string.encode()
+            self.strings[string] = len(self.strings)
+            self.file.write(_HEADER.pack(STRING, len(data)) + data)
+        return self.strings[string]
+
+    def location(self, fid: int, pc: int, flag: bool = False) -> bytes:
+        ln = self.goif.line_nos[fid][pc]
+        return _LOCATION.pack(self.string(self.goif.fid_to_str[fid]), 0 if ln == float('inf') else ln, flag)
+
+    def line(self, fid, pc, stmt):
+        self.file.write(_HEADER.pack(LINE, 0) + self.location(fid, pc, stmt.__class__ is End))
+
+    def store(self, var, value):
+        record = _HEADER.pack(STORE, self.string(var))
+        if value is UNSET:
+            record += bytes([V_UNSET])
+        elif value is True or value is False:
+            record += bytes([V_TRUE if value else V_FALSE])
+        elif isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+            record += bytes([V_INT]) + _INT.pack(value)
+        else:
+            data = str(value).encode()
+            record += bytes([V_BIGINT if isinstance(value, int) else V_STR]) + _LENGTH.pack(len(data)) + data
+        self.file.write(record)
+
+    def push(self, fid, pc):
+        self.file.write(_HEADER.pack(PUSH, 0) + self.location(fid, pc))
+
+    def pop(self, fid, pc):
+        self.file.write(_HEADER.pack(POP, 0) + self.location(fid, pc))
+
+    def throw(self, exc, explicit):
+        self.file.write(_HEADER.pack(THROW, self.string(exc)) + bytes([explicit]))
+
+    def handle(self, exc, fid, pc):
+        self.file.write(_HEADER.pack(HANDLE, self.string(exc)) + self.location(fid, pc))
+
+
+def read_trace(file: BinaryIO) -> Iterator[Tuple]:
+    """Read a binary trace, giving back each event as a tuple starting with the event's name.
+
+    Locations are given as a file name and a line number, which is None for lines typed into interactive mode."""
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a GOIF trace.")
+    strings = []
+
+    def read(size):
+        data = file.read(size)
+        if len(data) != size:
+            raise ValueError("The trace ends in the middle of a record.")
+        return data
+
+    def location():
+        name, ln, flag = _LOCATION.unpack(read(_LOCATION.size))
+        return strings[name], ln or None, bool(flag)
+
+    while header := file.read(_HEADER.size):
+        if len(header) != _HEADER.size:
+            raise ValueError("The trace ends in the middle of a record.")
+        kind, arg = _HEADER.unpack(header)
+        if kind == STRING:
+            strings.append(read(arg).decode())
+        elif kind == LINE:
+            fname, ln, end = location()
+            yield ('line', fname, ln, end)
+        elif kind == STORE:
+            tag = read(1)[0]
+            if tag == V_UNSET:
+                value = UNSET
+            elif tag in (V_FALSE, V_TRUE):
+                value = tag == V_TRUE
+            elif tag == V_INT:
+                value, = _INT.unpack(read(_INT.size))
+            else:
+                length, = _LENGTH.unpack(read(_LENGTH.size))
+                value = read(length).decode()
+                if tag == V_BIGINT:
+                    value = int(value)
+            yield ('store', strings[arg], value)
+        elif kind in (PUSH, POP):
+            fname, ln, _ = location()
+            yield ('push' if kind == PUSH else 'pop', fname, ln)
+        elif kind == THROW:
+            yield ('throw', strings[arg], bool(read(1)[0]))
+        elif kind == HANDLE:
+            fname, ln, _ = location()
+            yield ('handle', strings[arg], fname, ln)
+        else:
+            raise ValueError(f"Unknown record type {kind}.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage:\n tracing.py path/to/file.trace")
+        exit(1)
+    with open(sys.argv[1], 'rb') as f:
+        for event in read_trace(f):
+            print(*event)